@@ -0,0 +1,143 @@
+import zlib
+from django.db import transaction
+from chat import encoding, game_events
+from chat.models import (
+    ArchivedGame,
+    Game,
+    GameBoard,
+    GameEvent,
+    GamePiece,
+    GameSnapshot,
+    Player,
+    Room,
+)
+
+ARCHIVE_VERSION = 1
+
+
+def get_finished_game_ids(limit: int) -> list[int]:
+    return list(
+        Game.objects.filter(state="finished")
+        .order_by("id")
+        .values_list("id", flat=True)[:limit]
+    )
+
+
+def build_records(game_ids: list[int]) -> dict:
+    # One values_list query per table for the whole batch; rows are kept as
+    # lists to keep the records small.
+    records = {
+        game_id: {
+            "version": ARCHIVE_VERSION,
+            "game": {
+                "id": game_id,
+                "room_name": room_name,
+                "state": state,
+                "cols": cols,
+                "rows": rows,
+                "turn_order": turn_order,
+            },
+            "players": [],
+            "pieces": [],
+            "events": [],
+        }
+        for game_id, room_name, state, cols, rows, turn_order in Game.objects.filter(
+            id__in=game_ids
+        ).values_list(
+            "id", "room__name", "state", "board__cols", "board__rows", "turn_order"
+        )
+    }
+    for game_id, *player in Player.objects.filter(game_id__in=game_ids).values_list(
+        "game_id", "id", "user_id", "name", "order"
+    ):
+        records[game_id]["players"].append(player)
+    for game_id, *piece in GamePiece.objects.filter(
+        owner__game_id__in=game_ids
+    ).values_list(
+        "owner__game_id",
+        "id",
+        "owner_id",
+        "name",
+        "col",
+        "row",
+        "class_name",
+        "movement",
+    ):
+        records[game_id]["pieces"].append(piece)
+    for game_id, seq, kind, payload, created_at in (
+        GameEvent.objects.filter(game_id__in=game_ids)
+        .order_by("game_id", "seq")
+        .values_list("game_id", "seq", "kind", "payload", "created_at")
+    ):
+        records[game_id]["events"].append([seq, kind, payload, created_at.isoformat()])
+    return records
+
+
+def compress_record(record: dict) -> bytes:
+    return zlib.compress(encoding.dumps(record).encode())
+
+
+def decompress_record(data: bytes) -> dict:
+    return encoding.loads(zlib.decompress(data))
+
+
+def archive_games(game_ids: list[int]) -> int:
+    # Archives the finished games among game_ids and deletes their rows from
+    # the hot tables, one bulk delete per table. Returns how many it archived.
+    with transaction.atomic():
+        game_ids = list(
+            Game.objects.select_for_update()
+            .filter(id__in=game_ids, state="finished")
+            .values_list("id", flat=True)
+        )
+        if not game_ids:
+            return 0
+        records = build_records(game_ids)
+        ArchivedGame.objects.bulk_create(
+            [
+                ArchivedGame(
+                    game_id=game_id,
+                    room_name=record["game"]["room_name"],
+                    event_count=len(record["events"]),
+                    data=compress_record(record),
+                )
+                for game_id, record in records.items()
+            ]
+        )
+
+        games = Game.objects.filter(id__in=game_ids)
+        room_ids = list(games.values_list("room_id", flat=True))
+        board_ids = list(games.values_list("board_id", flat=True))
+        # Children first, so the cascades Django checks on each delete find
+        # nothing left to collect.
+        GameEvent.objects.filter(game_id__in=game_ids).delete()
+        GameSnapshot.objects.filter(game_id__in=game_ids).delete()
+        GamePiece.objects.filter(board_id__in=board_ids).delete()
+        Player.objects.filter(game_id__in=game_ids).delete()
+        games.delete()
+        Room.occupants.through.objects.filter(room_id__in=room_ids).delete()
+        Room.objects.filter(id__in=room_ids).delete()
+        GameBoard.objects.filter(id__in=board_ids).delete()
+    return len(game_ids)
+
+
+def load_archived_game(game_id: int):
+    data = (
+        ArchivedGame.objects.filter(game_id=game_id)
+        .values_list("data", flat=True)
+        .first()
+    )
+    if data is None:
+        return None
+    return decompress_record(bytes(data))
+
+
+def rebuild_archived_state(record: dict, up_to_seq: int = None) -> dict:
+    # The archived counterpart of Game.rebuild_state; snapshots are not
+    # archived, so this always replays from the first event.
+    game_state = game_events.empty_game_state()
+    for seq, kind, payload, _created_at in record["events"]:
+        if up_to_seq is not None and seq > up_to_seq:
+            break
+        game_events.apply_game_event(game_state, kind, payload)
+    return game_state
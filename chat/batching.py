@@ -0,0 +1,18 @@
+from chat import encoding
+
+# The batch has not looked up the user's room yet; None means no room.
+UNKNOWN = object()
+
+
+class Batch:
+    # State shared by the messages of one {"batch": [...]} frame while it is
+    # being handled. Replies are collected in frames and sent as one.
+    __slots__ = ("frames", "room_name", "client_touched")
+
+    def __init__(self):
+        self.frames: list[str] = []
+        self.room_name = UNKNOWN
+        self.client_touched = False
+
+    def encode(self) -> str:
+        return encoding.encode_batch(self.frames)
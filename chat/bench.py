@@ -0,0 +1,152 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Callable
+from django.core.management.base import BaseCommand
+
+
+def measure(fn: Callable, repeat: int = 5, number: int = 1, setup: Callable = None):
+    timings = []
+    for _i in range(repeat):
+        args = setup() if setup else ()
+        start = time.perf_counter()
+        for _j in range(number):
+            fn(*args)
+        timings.append((time.perf_counter() - start) / number)
+
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+        "repeat": repeat,
+        "number": number,
+    }
+
+
+def write_results(path: str, suite: str, results: dict):
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text(
+        json.dumps(
+            {
+                "suite": suite,
+                "python": platform.python_version(),
+                "machine": platform.machine(),
+                "results": results,
+            },
+            indent=2,
+            sort_keys=True,
+        )
+        + "\n"
+    )
+
+
+def read_results(path: str) -> dict:
+    return json.loads(Path(path).read_text())["results"]
+
+
+def compare_results(baseline: dict, current: dict) -> list[tuple]:
+    rows = []
+    for case in sorted(current):
+        if case not in baseline:
+            continue
+        before = baseline[case]["median"]
+        after = current[case]["median"]
+        rows.append(
+            (
+                case,
+                before,
+                after,
+                after / before if before else None,
+                current[case].get("unit", "seconds"),
+            )
+        )
+    return rows
+
+
+def format_bytes(size: float) -> str:
+    for unit, scale in (("MB", 1 << 20), ("KB", 1 << 10)):
+        if size >= scale:
+            return f"{size / scale:.2f}{unit}"
+    return f"{size:.0f}B"
+
+
+def format_seconds(seconds: float) -> str:
+    for unit, scale in (("s", 1), ("ms", 1e-3), ("us", 1e-6)):
+        if seconds >= scale:
+            return f"{seconds / scale:.2f}{unit}"
+    return f"{seconds / 1e-9:.0f}ns"
+
+
+def format_value(value: float, unit: str = "seconds") -> str:
+    # Cases that measure memory put "unit": "bytes" in their stats.
+    return format_bytes(value) if unit == "bytes" else format_seconds(value)
+
+
+def measure_allocations(fn: Callable, repeat: int = 5, setup: Callable = None):
+    # Peak bytes allocated by one call, as seen by tracemalloc.
+    peaks = []
+    for _i in range(repeat):
+        args = setup() if setup else ()
+        tracemalloc.start()
+        fn(*args)
+        peaks.append(tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+
+    return {
+        "min": min(peaks),
+        "median": statistics.median(peaks),
+        "max": max(peaks),
+        "repeat": repeat,
+        "number": 1,
+        "unit": "bytes",
+    }
+
+
+class BenchCommand(BaseCommand):
+    suite: str
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--output",
+            default=None,
+            help="Where to write results (default: benchmarks/<suite>.json)",
+        )
+        parser.add_argument(
+            "--compare",
+            default=None,
+            help="Results file from an earlier run to compare against",
+        )
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument(
+            "--quick",
+            action="store_true",
+            help="Only run the smallest sizes of each case",
+        )
+
+    def handle(self, *args, **options):
+        results = {}
+        for case, stats in self.run_benchmarks(options):
+            results[case] = stats
+            median = format_value(stats["median"], stats.get("unit", "seconds"))
+            self.stdout.write(f"{case:<60} {median:>10}")
+
+        output = options["output"] or f"benchmarks/{self.suite}.json"
+        write_results(output, self.suite, results)
+        self.stdout.write(f"Wrote {len(results)} results to {output}")
+
+        if options["compare"]:
+            self.stdout.write(f"\nCompared with {options['compare']}:")
+            for case, before, after, ratio, unit in compare_results(
+                read_results(options["compare"]), results
+            ):
+                self.stdout.write(
+                    f"{case:<60} {format_value(before, unit):>10} -> "
+                    f"{format_value(after, unit):>10} ({ratio:.2f}x)"
+                )
+
+    def run_benchmarks(self, options):
+        raise NotImplementedError()
@@ -0,0 +1,63 @@
+import asyncio
+import random
+import zlib
+from django.conf import settings
+
+LOBBY_SUBSCRIBERS = "LOBBY_SUBSCRIBERS"
+
+HIGH_PRIORITY = "high"
+LOW_PRIORITY = "low"
+
+background_sends: set[asyncio.Future] = set()
+
+
+def get_shard(group: str, channel_name: str) -> str:
+    # crc32 rather than hash() so every worker process agrees on the shard.
+    shard = zlib.crc32(channel_name.encode()) % settings.BROADCAST_SHARD_COUNT
+    return f"{group}.{shard}"
+
+
+def get_shards(group: str) -> list[str]:
+    return [f"{group}.{shard}" for shard in range(settings.BROADCAST_SHARD_COUNT)]
+
+
+async def broadcast_to_group(
+    channel_layer,
+    group: str,
+    message: dict,
+    sample: float = 1.0,
+    priority: str = HIGH_PRIORITY,
+):
+    # Sends to every shard of group at once. sample < 1 only sends to that
+    # fraction of the shards, and so roughly that fraction of the members.
+    # Low priority sends are not awaited, so the caller can carry on while
+    # the shards are expanded.
+    shards = get_shards(group)
+    if sample < 1.0:
+        shards = random.sample(shards, max(1, round(len(shards) * sample)))
+
+    await send_with_priority(
+        asyncio.gather(*(channel_layer.group_send(shard, message) for shard in shards)),
+        priority,
+    )
+
+
+async def broadcast_to_lobby_subscribers(
+    channel_layer,
+    message: dict,
+    sample: float = 1.0,
+    priority: str = HIGH_PRIORITY,
+):
+    # Only connections with a lobby_subscribe in force are in the shards.
+    await broadcast_to_group(
+        channel_layer, LOBBY_SUBSCRIBERS, message, sample, priority
+    )
+
+
+async def send_with_priority(send, priority: str):
+    send = asyncio.ensure_future(send)
+    if priority == LOW_PRIORITY:
+        background_sends.add(send)
+        send.add_done_callback(background_sends.discard)
+        return
+    await send
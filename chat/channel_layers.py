@@ -0,0 +1,164 @@
+import asyncio
+import collections
+import functools
+import time
+from channels_redis.core import BoundedQueue, RedisChannelLayer
+
+
+class HybridChannelLayer(RedisChannelLayer):
+    # Channels created by this process are delivered to straight from memory
+    # instead of taking a Redis round trip and a msgpack step. Redis is only
+    # used for channels on other processes. With single_process=True group
+    # membership is never written to Redis at all, so only use it when every
+    # consumer and every sender runs in this one process.
+    #
+    # Local messages go to a queue of their own rather than RedisChannelLayer's
+    # receive_buffer: whichever receiver holds the receive lock sits in a Redis
+    # BRPOP that nothing local can wake, so receive waits on both.
+    def __init__(self, *args, single_process=False, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.single_process = single_process
+        self.local_groups = collections.defaultdict(set)
+        self.local_queues = collections.defaultdict(
+            functools.partial(BoundedQueue, self.capacity)
+        )
+        # Each local channel's Redis receive, kept across calls while local
+        # messages win the race, so nothing it pulled off Redis is dropped.
+        self.remote_receives: dict[str, asyncio.Future] = {}
+
+    def is_local_channel(self, channel: str) -> bool:
+        return "!" in channel and self.non_local_name(channel).endswith(
+            self.client_prefix + "!"
+        )
+
+    def deliver_locally(self, channel: str, message: dict):
+        # Receivers share one message dict, so consumers must not mutate it.
+        self.local_queues[channel].put_nowait(message)
+
+    async def receive(self, channel):
+        if not self.is_local_channel(channel):
+            return await super().receive(channel)
+
+        local_queue = self.local_queues[channel]
+        try:
+            if not local_queue.empty():
+                return local_queue.get_nowait()
+            if self.single_process:
+                return await local_queue.get()
+
+            remote_receive = self.remote_receives.get(channel)
+            if remote_receive is None:
+                remote_receive = asyncio.ensure_future(super().receive(channel))
+                self.remote_receives[channel] = remote_receive
+            local_receive = asyncio.ensure_future(local_queue.get())
+            try:
+                await asyncio.wait(
+                    [local_receive, remote_receive],
+                    return_when=asyncio.FIRST_COMPLETED,
+                )
+            except asyncio.CancelledError:
+                del self.remote_receives[channel]
+                remote_receive.cancel()
+                raise
+            finally:
+                local_receive.cancel()
+
+            if local_receive.done() and not local_receive.cancelled():
+                return local_receive.result()
+            del self.remote_receives[channel]
+            return remote_receive.result()
+        finally:
+            if local_queue.empty():
+                self.local_queues.pop(channel, None)
+
+    async def send(self, channel, message):
+        if self.is_local_channel(channel):
+            assert self.valid_channel_name(channel), "Channel name not valid"
+            self.deliver_locally(channel, message)
+            return
+        await super().send(channel, message)
+
+    async def group_add(self, group, channel):
+        if self.is_local_channel(channel):
+            assert self.valid_group_name(group), "Group name not valid"
+            self.local_groups[group].add(channel)
+            if self.single_process:
+                return
+        await super().group_add(group, channel)
+
+    async def group_discard(self, group, channel):
+        local_channels = self.local_groups.get(group)
+        if local_channels is not None:
+            local_channels.discard(channel)
+            if not local_channels:
+                del self.local_groups[group]
+            if self.single_process:
+                return
+        await super().group_discard(group, channel)
+
+    async def group_send(self, group, message):
+        assert self.valid_group_name(group), "Group name not valid"
+        for channel in self.local_groups.get(group, ()):
+            self.deliver_locally(channel, message)
+        if self.single_process:
+            return
+
+        key = self._group_key(group)
+        connection = self.connection(self.consistent_hash(group))
+        await connection.zremrangebyscore(
+            key, min=0, max=int(time.time()) - self.group_expiry
+        )
+        remote_channels = [
+            channel
+            for channel in (
+                name.decode("utf8") for name in await connection.zrange(key, 0, -1)
+            )
+            if not self.is_local_channel(channel)
+        ]
+        if remote_channels:
+            await self.send_to_remote_channels(remote_channels, message)
+
+    async def send_to_remote_channels(self, channel_names, message):
+        # Same as the tail of RedisChannelLayer.group_send, minus the local
+        # channels that group_send already delivered to.
+        (
+            connection_to_channel_keys,
+            channel_keys_to_message,
+            channel_keys_to_capacity,
+        ) = self._map_channel_keys_to_connection(channel_names, message)
+
+        for connection_index, channel_keys in connection_to_channel_keys.items():
+            connection = self.connection(connection_index)
+            pipe = connection.pipeline()
+            for key in channel_keys:
+                pipe.zremrangebyscore(
+                    key, min=0, max=int(time.time()) - int(self.expiry)
+                )
+            await pipe.execute()
+
+            args = [channel_keys_to_message[key] for key in channel_keys]
+            args += [channel_keys_to_capacity[key] for key in channel_keys]
+            args += [time.time(), self.expiry]
+            await connection.eval(
+                GROUP_SEND_LUA, len(channel_keys), *channel_keys, *args
+            )
+
+    async def flush(self):
+        self.local_groups.clear()
+        self.local_queues.clear()
+        for remote_receive in self.remote_receives.values():
+            remote_receive.cancel()
+        self.remote_receives.clear()
+        await super().flush()
+
+
+GROUP_SEND_LUA = """
+    local current_time = ARGV[#ARGV - 1]
+    local expiry = ARGV[#ARGV]
+    for i=1,#KEYS do
+        if redis.call('ZCOUNT', KEYS[i], '-inf', '+inf') < tonumber(ARGV[i + #KEYS]) then
+            redis.call('ZADD', KEYS[i], current_time, ARGV[i])
+            redis.call('EXPIRE', KEYS[i], expiry)
+        end
+    end
+"""
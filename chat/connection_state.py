@@ -0,0 +1,37 @@
+from typing import Optional
+from chat.batching import Batch, UNKNOWN
+from chat.viewport import Viewport
+
+
+class ConnectionState:
+    # Everything a connection keeps between messages. Only ids and small
+    # values are held, never ORM instances, so an idle socket stays cheap.
+    __slots__ = (
+        "client_id",
+        "user_id",
+        "username",
+        "viewport",
+        "lobby_filter",
+        "spectating",
+        "batch",
+    )
+
+    def __init__(self, client_id: int):
+        self.client_id = client_id
+        self.user_id: Optional[int] = None
+        self.username: Optional[str] = None
+        self.viewport: Optional[Viewport] = None
+        self.lobby_filter: Optional[str] = None
+        self.spectating: Optional[str] = None
+        # Only set while a batch frame is being handled.
+        self.batch: Optional[Batch] = None
+
+    @property
+    def is_authenticated(self) -> bool:
+        return self.user_id is not None
+
+    def authenticate(self, user_id: int, username: str):
+        self.user_id = user_id
+        self.username = username
+        if self.batch is not None:
+            self.batch.room_name = UNKNOWN
@@ -1,81 +1,171 @@
-import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from channels.db import database_sync_to_async
-from .models import Client
-from chat import ws_message_handlers
+from django.conf import settings
+from .batching import Batch
+from .connection_state import ConnectionState
+from .models import Client, Player
+from .viewport import filter_game_info_message
+from chat import encoding, lobby, ws_message_handlers
+from chat.matchmaking import matchmaker
+from chat.traffic import traffic_recorder, CONNECTED, DISCONNECTED, INBOUND, OUTBOUND
 
 
 class FriEndsConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        await self.create_client()
+        if traffic_recorder.enabled:
+            traffic_recorder.record(self.channel_name, CONNECTED)
+        self.state = ConnectionState(await self.create_client())
         await self.accept()
         await self.send(
-            text_data=json.dumps(
+            text_data=encoding.dumps(
                 {
                     "message": (
                         "Connection established! "
                         "Authenticate within the next minute "
                         "or your connection will be closed."
                     ),
-                    "client_name": self.client.channel_name,
+                    "client_name": self.channel_name,
                     "type": "client_created",
                 }
             )
         )
-        await self.channel_layer.group_add("ALL_USERS", self.channel_name)
 
     async def disconnect(self, close_code):
-        await self.register_client_disconnect()
-        await self.channel_layer.group_discard("ALL_USERS", self.channel_name)
+        if traffic_recorder.enabled:
+            traffic_recorder.record(self.channel_name, DISCONNECTED)
+        if self.state.is_authenticated:
+            matchmaker.cancel(self.state.user_id)
+        await ws_message_handlers.stop_spectating(self)
+        await ws_message_handlers.leave_lobby(self)
+        turn = await self.register_client_disconnect()
+        if turn is not None:
+            await ws_message_handlers.turn_service.play_turns(self, *turn)
 
     async def forward_broadcast(self, event):
-        await self.send(text_data=json.dumps(event["broadcast_message"]))
+        await self.send(text_data=encoding.dumps(event["broadcast_message"]))
 
-    async def receive(self, text_data):
-        message = json.loads(text_data)["message"]
-        client = await self.get_client()
-
-        HandlerClasses = [
-            ws_message_handlers.NaiveCreateUserHandler,
-            ws_message_handlers.NaiveAuthHandler,
-            ws_message_handlers.RoomInfoHandler,
-            ws_message_handlers.JoinRoomHandler,
-            ws_message_handlers.LeaveRoomHandler,
-            ws_message_handlers.GameInfoHandler,
-            ws_message_handlers.AuthedUserHandler,
-        ]
-
-        for HandlerClass in HandlerClasses:
-            if (
-                HandlerClass.message_types == ["all"]
-                or message["type"] in HandlerClass.message_types
-            ):
-                handler = HandlerClass(
-                    client=client,
-                    consumer=self,
-                    scope=self.scope,
-                )
-                await handler.handle(message)
+    async def forward_frame(self, event):
+        await self.send(text_data=event["frame"])
 
-    @database_sync_to_async
-    def get_client(self):
-        return Client.objects.get(
-            channel_name=self.channel_name,
+    async def forward_piece_moved(self, event):
+        views = event.get("views")
+        if views is None:
+            await self.send_piece_moved(
+                event["frame"], event["changed_cells"], event["broadcast_message"]
+            )
+            return
+        # Under fog of war a player gets the move, their new view or both.
+        for message_type, frame in views.get(self.state.username, ()):
+            if message_type == "game_info":
+                # The player's sight changed, not just the moved cells.
+                await self.send_game_info(frame)
+            else:
+                await self.send_piece_moved(frame, event["changed_cells"])
+
+    async def send_game_info(self, frame: str):
+        viewport = self.state.viewport
+        if viewport is None:
+            await self.send(text_data=frame)
+            return
+        message = filter_game_info_message(encoding.loads(frame), viewport)
+        await self.send(text_data=encoding.encode_game_info(message))
+
+    async def send_piece_moved(self, frame: str, changed_cells, message=None):
+        viewport = self.state.viewport
+        if viewport is None:
+            await self.send(text_data=frame)
+            return
+        if not viewport.intersects(changed_cells):
+            return
+        message = message or encoding.loads(frame)
+        piece = message["piece"]
+        message = {
+            **message,
+            "piece": {
+                **piece,
+                "moveableSpaces": viewport.clip(piece["moveableSpaces"]),
+            },
+        }
+        await self.send(text_data=encoding.dumps(message))
+
+    async def forward_lobby_event(self, event):
+        if self.state.lobby_filter is None:
+            return
+        message = lobby.get_lobby_event_message(
+            event["event"],
+            event["room"],
+            self.state.lobby_filter,
         )
+        if message is not None:
+            await self.send(text_data=encoding.dumps(message))
+
+    async def matchmaking_matched(self, event):
+        await ws_message_handlers.matchmaking_matched_handler.handle(self, event)
+
+    async def send(self, text_data=None, bytes_data=None, close=False):
+        if self.state.batch is not None and text_data is not None:
+            self.state.batch.frames.append(text_data)
+            return
+        if traffic_recorder.enabled and text_data is not None:
+            traffic_recorder.record(self.channel_name, OUTBOUND, text_data)
+        await super().send(text_data=text_data, bytes_data=bytes_data, close=close)
+
+    async def receive(self, text_data):
+        if traffic_recorder.enabled:
+            traffic_recorder.record(self.channel_name, INBOUND, text_data)
+        data = encoding.loads(text_data)
+        if "batch" in data:
+            await self.receive_batch(data["batch"])
+        else:
+            await self.handle_message(data["message"])
+
+    async def receive_batch(self, messages):
+        if (
+            not isinstance(messages, list)
+            or len(messages) > settings.MAX_MESSAGES_PER_BATCH
+        ):
+            await self.send(
+                text_data=encoding.error_frame("batch error", "Invalid batch")
+            )
+            return
+        # Channel layer events wait until receive returns, so everything
+        # sent in the meantime is a reply to this batch.
+        self.state.batch = Batch()
+        try:
+            for message in messages:
+                await self.handle_message(message)
+        finally:
+            batch, self.state.batch = self.state.batch, None
+        await self.send(text_data=batch.encode())
+
+    async def handle_message(self, message):
+        for handler in ws_message_handlers.get_handlers(message["type"]):
+            await handler.handle(self, message)
 
     @database_sync_to_async
-    def create_client(self):
-        client = Client.objects.create(
+    def create_client(self) -> int:
+        return Client.objects.create(
             channel_name=self.channel_name,
             connected=True,
-        )
-        self.client = client
+        ).id
 
     @database_sync_to_async
     def register_client_disconnect(self):
-        client = Client.objects.get(
-            channel_name=self.channel_name,
+        # Returns (game, current player) if the turn passed on because this
+        # player left. Nothing to do if the user has since authenticated on
+        # another connection, which deletes this one's client.
+        if not Client.objects.filter(pk=self.state.client_id).update(connected=False):
+            return None
+        if self.state.user_id is None:
+            return None
+        player = (
+            Player.objects.filter(user_id=self.state.user_id)
+            .select_related("game__room")
+            .first()
         )
-        client.connected = False
-        client.save()
+        if player is None:
+            return None
+        current = player.game.player_connection_changed(player, connected=False)
+        if current is None:
+            return None
+        return player.game, current
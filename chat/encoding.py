@@ -0,0 +1,100 @@
+import functools
+import json
+from django.conf import settings
+from chat.models import REQUIRED_PLAYER_COUNT
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+
+class StdlibEncoder:
+    name = "json"
+
+    def dumps(self, message) -> str:
+        return json.dumps(message, separators=(",", ":"))
+
+    def loads(self, text: str):
+        return json.loads(text)
+
+
+class OrjsonEncoder:
+    name = "orjson"
+
+    def dumps(self, message) -> str:
+        return orjson.dumps(message).decode()
+
+    def loads(self, text: str):
+        return orjson.loads(text)
+
+
+def load_encoder(name: str = "auto"):
+    # "auto" picks the fastest backend that is installed.
+    if name == "auto":
+        name = "orjson" if orjson is not None else "json"
+    if name == "orjson":
+        if orjson is None:
+            raise ImportError("JSON_ENCODER is orjson but orjson is not installed")
+        return OrjsonEncoder()
+    if name == "json":
+        return StdlibEncoder()
+    raise ValueError(f"Unknown JSON_ENCODER {name!r}")
+
+
+encoder = load_encoder(settings.JSON_ENCODER)
+
+
+def dumps(message) -> str:
+    return encoder.dumps(message)
+
+
+def loads(text: str):
+    return encoder.loads(text)
+
+
+@functools.lru_cache(maxsize=None)
+def error_frame(kind: str, error: str) -> str:
+    # Only ever called with constant strings, so the cache stays small.
+    return dumps({"type": kind, "error": error})
+
+
+@functools.lru_cache(maxsize=None)
+def static_frame(message_type: str) -> str:
+    return dumps({"type": message_type})
+
+
+@functools.lru_cache(maxsize=1024)
+def get_game_constants(cols: int, rows: int) -> str:
+    # The members of game_info["game"] that never change during a game,
+    # encoded once per board size.
+    members = dumps(
+        {"requiredPlayers": REQUIRED_PLAYER_COUNT, "grid": {"cols": cols, "rows": rows}}
+    )
+    return members[1:-1]
+
+
+def splice(members: str, encoded_object: str) -> str:
+    # Inserts pre-encoded "key":value members into an encoded JSON object.
+    if encoded_object == "{}":
+        return "{" + members + "}"
+    return "{" + members + "," + encoded_object[1:]
+
+
+def encode_game_info(message: dict) -> str:
+    game = message["game"]
+    grid = game["grid"]
+    dynamic = {
+        key: value
+        for key, value in game.items()
+        if key not in ("grid", "requiredPlayers")
+    }
+    encoded_game = splice(
+        get_game_constants(grid["cols"], grid["rows"]), dumps(dynamic)
+    )
+    return '{"type":"game_info","game":' + encoded_game + "}"
+
+
+def encode_batch(frames: list[str]) -> str:
+    # The replies to a batch frame, already encoded, in one message.
+    return '{"type":"batch","messages":[' + ",".join(frames) + "]}"
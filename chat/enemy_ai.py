@@ -0,0 +1,73 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from django.conf import settings
+from chat.pathfinding import Grid, manhattan, reachable_spaces
+
+
+def plan_enemy_turn(snapshot: dict, budget: float) -> list[tuple[int, int, int]]:
+    # Runs in a worker process, so it only touches the plain-data snapshot
+    # built by Game.get_plan_snapshot and never the ORM.
+    deadline = time.monotonic() + budget
+    enemy_player_id = snapshot["enemy_player_id"]
+    occupied = {(col, row) for _id, _owner, col, row, _movement in snapshot["pieces"]}
+    targets = [
+        (col, row)
+        for _id, owner_id, col, row, _movement in snapshot["pieces"]
+        if owner_id != enemy_player_id
+    ]
+    if not targets:
+        return []
+
+    moves = []
+    for piece_id, owner_id, col, row, movement in snapshot["pieces"]:
+        if owner_id != enemy_player_id:
+            continue
+        if time.monotonic() >= deadline:
+            break
+
+        grid = Grid(snapshot["cols"], snapshot["rows"], occupied)
+        start = (col, row)
+        best_space = start
+        best_distance = min(manhattan(start, target) for target in targets)
+        for space in reachable_spaces(grid, start, movement):
+            distance = min(manhattan(space, target) for target in targets)
+            if distance < best_distance:
+                best_space, best_distance = space, distance
+
+        if best_space != start:
+            occupied.discard(start)
+            occupied.add(best_space)
+            moves.append((piece_id, *best_space))
+    return moves
+
+
+class EnemyPlanner:
+    def __init__(self):
+        self.executor = None
+
+    def get_executor(self) -> ProcessPoolExecutor:
+        if self.executor is None:
+            self.executor = ProcessPoolExecutor(
+                max_workers=settings.ENEMY_AI_PROCESSES,
+            )
+        return self.executor
+
+    async def plan(self, snapshot: dict, budget: float = None):
+        budget = settings.ENEMY_AI_TURN_BUDGET if budget is None else budget
+        loop = asyncio.get_running_loop()
+        future = loop.run_in_executor(
+            self.get_executor(),
+            plan_enemy_turn,
+            snapshot,
+            budget,
+        )
+        try:
+            # The planner stops itself at the budget; the extra second only
+            # covers a saturated pool, in which case the enemy skips its turn.
+            return await asyncio.wait_for(future, budget + 1)
+        except asyncio.TimeoutError:
+            return []
+
+
+enemy_planner = EnemyPlanner()
@@ -0,0 +1,53 @@
+SNAPSHOT_INTERVAL = 50
+
+JOIN = "join"
+LEAVE = "leave"
+PLACE = "place"
+MOVE = "move"
+STATE = "state"
+
+EVENT_KINDS = [JOIN, LEAVE, PLACE, MOVE, STATE]
+
+
+def empty_game_state() -> dict:
+    return {
+        "state": "waiting",
+        "players": {},
+        "pieces": {},
+    }
+
+
+def apply_game_event(game_state: dict, kind: str, payload: dict) -> dict:
+    # JSON object keys are always strings, so ids are stored as str
+    # to keep snapshots loaded from the db identical to rebuilt ones.
+    if kind == JOIN:
+        game_state["players"][str(payload["player"])] = {
+            "name": payload["name"],
+            "order": payload["order"],
+        }
+    elif kind == LEAVE:
+        player_id = payload["player"]
+        game_state["players"].pop(str(player_id), None)
+        game_state["pieces"] = {
+            piece_id: piece
+            for piece_id, piece in game_state["pieces"].items()
+            if piece["owner"] != player_id
+        }
+    elif kind == PLACE:
+        game_state["pieces"][str(payload["piece"])] = {
+            "name": payload["name"],
+            "owner": payload["owner"],
+            "col": payload["col"],
+            "row": payload["row"],
+            "class_name": payload["class_name"],
+            "movement": payload["movement"],
+        }
+    elif kind == MOVE:
+        piece = game_state["pieces"][str(payload["piece"])]
+        piece["col"] = payload["col"]
+        piece["row"] = payload["row"]
+    elif kind == STATE:
+        game_state["state"] = payload["state"]
+    else:
+        raise ValueError(f"Unknown game event kind: {kind}")
+    return game_state
@@ -0,0 +1,86 @@
+from chat.broadcast import broadcast_to_lobby_subscribers, HIGH_PRIORITY
+from chat.models import Room, REQUIRED_PLAYER_COUNT
+
+ROOM_ADDED = "room_added"
+ROOM_UPDATED = "room_updated"
+ROOM_REMOVED = "room_removed"
+
+ALL_ROOMS = "all"
+OPEN_ROOMS = "open"
+LOBBY_FILTERS = [ALL_ROOMS, OPEN_ROOMS]
+
+DEFAULT_PAGE_SIZE = 20
+MAX_PAGE_SIZE = 100
+
+
+def get_room_summaries(lobby_filter: str = ALL_ROOMS):
+    rooms = Room.objects.filter(pooled_at__isnull=True).order_by("id")
+    if lobby_filter == OPEN_ROOMS:
+        rooms = rooms.filter(occupant_count__lt=REQUIRED_PLAYER_COUNT)
+    return rooms.values("name", "occupant_count")
+
+
+def get_room_page(lobby_filter: str, page: int, page_size: int) -> dict:
+    rooms = get_room_summaries(lobby_filter)
+    offset = page * page_size
+    return {
+        "type": "room_page",
+        "filter": lobby_filter,
+        "page": page,
+        "pageSize": page_size,
+        "total": rooms.count(),
+        "rooms": [
+            to_room_summary(room["name"], room["occupant_count"])
+            for room in rooms[offset : offset + page_size]
+        ],
+    }
+
+
+def get_room_summary(room_name: str):
+    room = get_room_summaries().filter(name=room_name).first()
+    if room is None:
+        return None
+    return to_room_summary(room["name"], room["occupant_count"])
+
+
+def to_room_summary(name: str, occupant_count: int) -> dict:
+    return {
+        "name": name,
+        "capacity": REQUIRED_PLAYER_COUNT,
+        "occupantCount": occupant_count,
+    }
+
+
+def is_open(summary: dict) -> bool:
+    return summary["occupantCount"] < summary["capacity"]
+
+
+def get_lobby_event_message(event: str, summary: dict, lobby_filter: str):
+    # Returns what a subscriber with lobby_filter should see for event, or
+    # None. room_updated doubles as an upsert, so a room that opens up is
+    # sent as an update even to "open" subscribers that never had it.
+    if lobby_filter == OPEN_ROOMS and event != ROOM_REMOVED and not is_open(summary):
+        if event == ROOM_ADDED:
+            return None
+        event = ROOM_REMOVED
+
+    if event == ROOM_REMOVED:
+        return {"type": ROOM_REMOVED, "room": {"name": summary["name"]}}
+    return {"type": event, "room": summary}
+
+
+async def broadcast_lobby_event(
+    channel_layer,
+    event: str,
+    summary: dict,
+    priority: str = HIGH_PRIORITY,
+):
+    await broadcast_to_lobby_subscribers(
+        channel_layer,
+        {
+            "type": "forward_lobby_event",
+            "event": event,
+            "room": summary,
+        },
+        priority=priority,
+    )
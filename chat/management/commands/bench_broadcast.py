@@ -0,0 +1,78 @@
+import asyncio
+import statistics
+import time
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from django.test import override_settings
+from chat.bench import BenchCommand
+from chat.broadcast import LOBBY_SUBSCRIBERS, broadcast_to_group, get_shard
+from chat.channel_layers import HybridChannelLayer
+
+CONNECTION_COUNTS = [10_000, 50_000]
+SHARD_COUNTS = [1, 16, 64]
+# flush() deletes every key under the prefix, so keep clear of the app's.
+PREFIX = "bench_broadcast"
+
+LAYERS = {
+    "redis": RedisChannelLayer,
+    "hybrid": HybridChannelLayer,
+}
+
+
+async def measure_broadcast(layer, connection_count: int, repeat: int) -> dict:
+    # One sample is a broadcast to every connection until the last one has
+    # received it. Connections are plain channels on this process, as each
+    # consumer's would be.
+    channels = [await layer.new_channel() for _i in range(connection_count)]
+    for channel in channels:
+        await layer.group_add(get_shard(LOBBY_SUBSCRIBERS, channel), channel)
+
+    message = {"type": "forward_lobby_event", "event": "room_updated", "room": {}}
+    timings = []
+    try:
+        for _i in range(repeat):
+            start = time.perf_counter()
+            await broadcast_to_group(layer, LOBBY_SUBSCRIBERS, message)
+            await asyncio.gather(*(layer.receive(channel) for channel in channels))
+            timings.append(time.perf_counter() - start)
+    finally:
+        await layer.flush()
+        await layer.close_pools()
+
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+        "repeat": repeat,
+        "number": 1,
+    }
+
+
+class Command(BenchCommand):
+    help = (
+        f"Benchmark broadcasting to {LOBBY_SUBSCRIBERS} with different shard counts "
+        "(needs the Redis server from CHANNEL_LAYERS)"
+    )
+    suite = "broadcast"
+
+    def run_benchmarks(self, options):
+        hosts = settings.CHANNEL_LAYERS["default"]["CONFIG"]["hosts"]
+        connection_counts = (
+            CONNECTION_COUNTS[:1] if options["quick"] else CONNECTION_COUNTS
+        )
+        for connection_count in connection_counts:
+            for shard_count in SHARD_COUNTS:
+                for name, layer_class in LAYERS.items():
+                    with override_settings(BROADCAST_SHARD_COUNT=shard_count):
+                        stats = asyncio.run(
+                            measure_broadcast(
+                                layer_class(hosts=hosts, prefix=PREFIX),
+                                connection_count,
+                                options["repeat"],
+                            )
+                        )
+                    yield (
+                        f"broadcast[{name},connections={connection_count},"
+                        f"shards={shard_count}]",
+                        stats,
+                    )
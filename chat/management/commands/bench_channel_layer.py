@@ -0,0 +1,76 @@
+import asyncio
+import statistics
+import time
+from channels_redis.core import RedisChannelLayer
+from django.conf import settings
+from chat.bench import BenchCommand
+from chat.channel_layers import HybridChannelLayer
+
+GROUP_SIZES = [10, 100, 1000]
+SENDS = 20
+# flush() deletes every key under the prefix, so keep clear of the app's.
+PREFIX = "bench_channel_layer"
+
+LAYERS = {
+    "redis": lambda hosts: RedisChannelLayer(hosts=hosts, prefix=PREFIX),
+    "hybrid": lambda hosts: HybridChannelLayer(hosts=hosts, prefix=PREFIX),
+    "hybrid_single_process": lambda hosts: HybridChannelLayer(
+        hosts=hosts, prefix=PREFIX, single_process=True
+    ),
+}
+
+
+async def measure_group_send(layer, group_size: int, repeat: int) -> dict:
+    # Every member of the group lives on this process, as they do on a
+    # single-node deployment; one sample is a group_send plus every member
+    # receiving the message.
+    group = "bench"
+    channels = [await layer.new_channel() for _i in range(group_size)]
+    for channel in channels:
+        await layer.group_add(group, channel)
+
+    message = {
+        "type": "forward_broadcast",
+        "broadcast_message": {"type": "turn_changed", "currentPlayer": "Lyn"},
+    }
+    timings = []
+    try:
+        for _i in range(repeat):
+            start = time.perf_counter()
+            for _j in range(SENDS):
+                await layer.group_send(group, message)
+                await asyncio.gather(*(layer.receive(channel) for channel in channels))
+            timings.append((time.perf_counter() - start) / SENDS)
+    finally:
+        await layer.flush()
+        await layer.close_pools()
+
+    return {
+        "min": min(timings),
+        "median": statistics.median(timings),
+        "max": max(timings),
+        "repeat": repeat,
+        "number": SENDS,
+    }
+
+
+class Command(BenchCommand):
+    help = (
+        "Benchmark group_send on the stock Redis channel layer against the "
+        "hybrid layer (needs the Redis server from CHANNEL_LAYERS)"
+    )
+    suite = "channel_layer"
+
+    def run_benchmarks(self, options):
+        hosts = settings.CHANNEL_LAYERS["default"]["CONFIG"]["hosts"]
+        group_sizes = GROUP_SIZES[:1] if options["quick"] else GROUP_SIZES
+        for group_size in group_sizes:
+            for name, make_layer in LAYERS.items():
+                yield (
+                    f"group_send[{name},members={group_size}]",
+                    asyncio.run(
+                        measure_group_send(
+                            make_layer(hosts), group_size, options["repeat"]
+                        )
+                    ),
+                )
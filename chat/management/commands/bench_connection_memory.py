@@ -0,0 +1,81 @@
+import gc
+import statistics
+import tracemalloc
+import uuid
+from chat.bench import BenchCommand
+from chat.connection_state import ConnectionState
+from chat.consumers import FriEndsConsumer
+
+CONNECTION_COUNTS = [10_000, 100_000]
+
+
+def make_scope(index: int) -> dict:
+    # Roughly what daphne and the URL router put in a websocket scope.
+    return {
+        "type": "websocket",
+        "path": "/ws/friends/",
+        "raw_path": b"/ws/friends/",
+        "root_path": "",
+        "headers": [
+            (b"host", b"localhost:8000"),
+            (b"origin", b"http://localhost:3000"),
+            (b"upgrade", b"websocket"),
+            (b"connection", b"Upgrade"),
+            (b"sec-websocket-version", b"13"),
+            (b"sec-websocket-key", uuid.uuid4().hex.encode()),
+            (b"user-agent", b"Mozilla/5.0 (X11; Linux x86_64)"),
+        ],
+        "query_string": b"",
+        "client": ["127.0.0.1", 40000 + index % 20000],
+        "server": ["127.0.0.1", 8000],
+        "subprotocols": [],
+        "asgi": {"version": "3.0"},
+        "path_remaining": "",
+        "url_route": {"args": (), "kwargs": {}},
+    }
+
+
+def make_idle_connection(index: int) -> FriEndsConsumer:
+    # A consumer that has connected and authenticated and is now idle, built
+    # without a server so only its own memory is counted.
+    consumer = FriEndsConsumer()
+    consumer.scope = make_scope(index)
+    consumer.channel_name = f"specific.{uuid.uuid4().hex}!{uuid.uuid4().hex[:12]}"
+    consumer.state = ConnectionState(index)
+    consumer.state.authenticate(index, f"Lyn{index}")
+    return consumer
+
+
+def measure_connection_bytes(connection_count: int, repeat: int) -> dict:
+    samples = []
+    for _i in range(repeat):
+        gc.collect()
+        tracemalloc.start()
+        before = tracemalloc.get_traced_memory()[0]
+        connections = [make_idle_connection(index) for index in range(connection_count)]
+        after = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+        samples.append((after - before) / len(connections))
+        del connections
+
+    return {
+        "min": min(samples),
+        "median": statistics.median(samples),
+        "max": max(samples),
+        "repeat": repeat,
+        "number": connection_count,
+        "unit": "bytes",
+    }
+
+
+class Command(BenchCommand):
+    help = "Measure the memory held per idle websocket connection"
+    suite = "connection_memory"
+
+    def run_benchmarks(self, options):
+        counts = CONNECTION_COUNTS[:1] if options["quick"] else CONNECTION_COUNTS
+        for connection_count in counts:
+            yield (
+                f"bytes_per_idle_connection[connections={connection_count}]",
+                measure_connection_bytes(connection_count, options["repeat"]),
+            )
@@ -0,0 +1,105 @@
+import json
+import random
+from chat import encoding
+from chat.bench import BenchCommand, measure
+from chat.lobby import to_room_summary
+from chat.models import REQUIRED_PLAYER_COUNT, get_moveable_spaces
+from chat.unit_classes import DEFAULT_UNIT_CLASS
+
+NUMBER = 1000
+
+
+def make_game_info(size: int, piece_count: int) -> dict:
+    cells = random.sample(range(size * size), piece_count)
+    return {
+        "type": "game_info",
+        "game": {
+            "state": "playing",
+            "players": [{"name": "Lyn"}, {"name": "Hector"}, {"name": "ENEMY"}],
+            "currentPlayer": "Lyn",
+            "requiredPlayers": REQUIRED_PLAYER_COUNT,
+            "grid": {"cols": size, "rows": size},
+            "boardPieces": [
+                {
+                    "id": piece_id,
+                    "name": f"piece-{piece_id}",
+                    "className": DEFAULT_UNIT_CLASS,
+                    "row": cell // size,
+                    "col": cell % size,
+                    "player": {"name": "Lyn"},
+                    "moveableSpaces": get_moveable_spaces(
+                        cell % size, cell // size, 4, size, size
+                    ),
+                }
+                for piece_id, cell in enumerate(cells)
+            ],
+        },
+    }
+
+
+def get_messages() -> dict:
+    game_info = make_game_info(20, 3)
+    piece = game_info["game"]["boardPieces"][0]
+    return {
+        "game_info[20x20,pieces=3]": (game_info, encoding.encode_game_info),
+        "game_info[100x100,pieces=100]": (
+            make_game_info(100, 100),
+            encoding.encode_game_info,
+        ),
+        "piece_moved": (
+            {
+                "type": "piece_moved",
+                "from": (piece["col"], piece["row"]),
+                "path": [(piece["col"], piece["row"])] * 5,
+                "piece": piece,
+            },
+            encoding.dumps,
+        ),
+        "turn_changed": (
+            {"type": "turn_changed", "currentPlayer": "Lyn"},
+            encoding.dumps,
+        ),
+        "room_page": (
+            {
+                "type": "room_page",
+                "filter": "all",
+                "page": 0,
+                "pageSize": 20,
+                "total": 20,
+                "rooms": [to_room_summary(f"room-{i}", i % 3) for i in range(20)],
+            },
+            encoding.dumps,
+        ),
+        "room_error": (
+            {"type": "room error", "error": "Room not found"},
+            lambda message: encoding.error_frame(message["type"], message["error"]),
+        ),
+    }
+
+
+class Command(BenchCommand):
+    help = (
+        "Benchmark encoding each outbound message type with stdlib json "
+        f"against the {encoding.encoder.name} encoder layer"
+    )
+    suite = "encoding"
+
+    def run_benchmarks(self, options):
+        random.seed(0)
+        for message_type, (message, encode) in get_messages().items():
+            # What every send did before: stdlib json.dumps of the whole dict.
+            yield (
+                f"{message_type}[json.dumps]",
+                measure(
+                    lambda: json.dumps(message),
+                    repeat=options["repeat"],
+                    number=NUMBER,
+                ),
+            )
+            yield (
+                f"{message_type}[{encoding.encoder.name}]",
+                measure(
+                    lambda: encode(message), repeat=options["repeat"], number=NUMBER
+                ),
+            )
+            assert json.loads(encode(message)) == json.loads(json.dumps(message))
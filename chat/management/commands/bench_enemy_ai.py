@@ -0,0 +1,99 @@
+import asyncio
+import random
+import statistics
+import time
+from chat.bench import BenchCommand, measure
+from chat.enemy_ai import enemy_planner, plan_enemy_turn
+
+BOARD_SIZE = 200
+ENEMY_PIECES = 20
+PLAYER_PIECES = 50
+ROOM_COUNTS = [10, 100]
+TICK_INTERVAL = 0.01
+BUDGET = 0.5
+
+
+def random_snapshot() -> dict:
+    cells = random.sample(range(BOARD_SIZE * BOARD_SIZE), ENEMY_PIECES + PLAYER_PIECES)
+    return {
+        "cols": BOARD_SIZE,
+        "rows": BOARD_SIZE,
+        "enemy_player_id": 0,
+        "pieces": [
+            (
+                piece_id,
+                0 if piece_id < ENEMY_PIECES else 1,
+                cell % BOARD_SIZE,
+                cell // BOARD_SIZE,
+                8,
+            )
+            for piece_id, cell in enumerate(cells)
+        ],
+    }
+
+
+async def measure_loop_lag(planning) -> dict:
+    # A ticker that should wake every TICK_INTERVAL; how late it wakes up is
+    # how long every websocket on this loop would have waited too.
+    lags = []
+    done = asyncio.Event()
+
+    async def ticker():
+        while not done.is_set():
+            expected = time.perf_counter() + TICK_INTERVAL
+            await asyncio.sleep(TICK_INTERVAL)
+            lags.append(max(0.0, time.perf_counter() - expected))
+
+    ticker_task = asyncio.create_task(ticker())
+    await asyncio.sleep(TICK_INTERVAL)
+    start = time.perf_counter()
+    await planning()
+    elapsed = time.perf_counter() - start
+    done.set()
+    await ticker_task
+    return {
+        "min": min(lags),
+        "median": statistics.median(lags),
+        "max": max(lags),
+        "elapsed": elapsed,
+        "repeat": len(lags),
+        "number": 1,
+    }
+
+
+class Command(BenchCommand):
+    help = "Benchmark the enemy turn planner and its effect on the event loop"
+    suite = "enemy_ai"
+
+    def run_benchmarks(self, options):
+        random.seed(0)
+        room_counts = ROOM_COUNTS[:1] if options["quick"] else ROOM_COUNTS
+        snapshot = random_snapshot()
+        yield (
+            "plan_enemy_turn",
+            measure(
+                lambda: plan_enemy_turn(snapshot, BUDGET), repeat=options["repeat"]
+            ),
+        )
+
+        for room_count in room_counts:
+            snapshots = [random_snapshot() for _i in range(room_count)]
+
+            async def plan_inline():
+                for snapshot in snapshots:
+                    plan_enemy_turn(snapshot, BUDGET)
+                    await asyncio.sleep(0)
+
+            async def plan_in_pool():
+                await asyncio.gather(
+                    *(enemy_planner.plan(snapshot, BUDGET) for snapshot in snapshots)
+                )
+
+            yield (
+                f"event_loop_lag[inline,rooms={room_count}]",
+                asyncio.run(measure_loop_lag(plan_inline)),
+            )
+            yield (
+                f"event_loop_lag[process_pool,rooms={room_count}]",
+                asyncio.run(measure_loop_lag(plan_in_pool)),
+            )
@@ -0,0 +1,52 @@
+from django.db import transaction
+from chat.bench import BenchCommand, measure, measure_allocations
+from chat.management.commands.bench_models import create_bench_game
+from chat.models import Room
+from chat.projections import load_game_info_message
+from chat.ws_message_handlers import GAME_INFO_PREFETCH, RoomInfoMixin
+
+BOARD_PIECES = [(10, 3), (100, 100), (100, 1000)]
+
+
+class Command(BenchCommand):
+    help = (
+        "Benchmark building game_info from prefetched models against the "
+        "values_list projection"
+    )
+    suite = "game_info"
+
+    def run_benchmarks(self, options):
+        repeat = options["repeat"]
+        board_pieces = BOARD_PIECES[:1] if options["quick"] else BOARD_PIECES
+        mixin = RoomInfoMixin()
+
+        with transaction.atomic():
+            for size, piece_count in board_pieces:
+                room_name = create_bench_game(size, piece_count).room.name
+
+                def from_models():
+                    room = (
+                        Room.objects.filter(name=room_name)
+                        .prefetch_related(*GAME_INFO_PREFETCH)
+                        .first()
+                    )
+                    return mixin.get_game_info_message(room.game)
+
+                def from_projection():
+                    return load_game_info_message(room_name)
+
+                for name, build in (
+                    ("models", from_models),
+                    ("projection", from_projection),
+                ):
+                    case = f"{size}x{size},pieces={piece_count}"
+                    yield (
+                        f"game_info[{name},{case}]",
+                        measure(build, repeat=repeat),
+                    )
+                    yield (
+                        f"game_info_allocations[{name},{case}]",
+                        measure_allocations(build, repeat=repeat),
+                    )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,114 @@
+import random
+from itertools import count
+from django.contrib.auth.models import User
+from django.db import transaction
+from chat.bench import BenchCommand, measure
+from chat.models import Room, Player, GameBoard, GamePiece, Game
+from chat.ws_message_handlers import GAME_INFO_PREFETCH, RoomInfoMixin
+
+BOARD_SIZES = [10, 100, 1000]
+MOVEMENTS = [1, 5, 10, 20]
+PIECE_COUNTS = [3, 100, 1000, 10000]
+
+unique_ids = count()
+
+
+def create_bench_game(size: int, piece_count: int) -> Game:
+    room = Room.objects.create(name=f"bench-{next(unique_ids)}")
+    board = GameBoard.objects.create(rows=size, cols=size)
+    game = Game.objects.create(room=room, board=board, state="playing")
+    player = Player.objects.create(name="bench", order=0, game=game)
+    GamePiece.objects.bulk_create(
+        [
+            GamePiece(
+                owner=player,
+                board=board,
+                name=f"piece-{cell}",
+                col=cell % size,
+                row=cell // size,
+            )
+            for cell in random.sample(range(size * size), piece_count)
+        ]
+    )
+    board.repack()
+    return game
+
+
+class Command(BenchCommand):
+    help = "Benchmark the chat.models hot paths"
+    suite = "models"
+
+    def run_benchmarks(self, options):
+        repeat = options["repeat"]
+        sizes = BOARD_SIZES[:1] if options["quick"] else BOARD_SIZES
+        movements = MOVEMENTS[:1] if options["quick"] else MOVEMENTS
+        piece_counts = PIECE_COUNTS[:1] if options["quick"] else PIECE_COUNTS
+        board_pieces = [
+            (size, piece_count)
+            for size in sizes
+            for piece_count in piece_counts
+            if piece_count < size * size
+        ]
+
+        with transaction.atomic():
+            for size in sizes:
+                for movement in movements:
+                    board = GameBoard(rows=size, cols=size)
+                    piece = GamePiece(
+                        board=board,
+                        col=size // 2,
+                        row=size // 2,
+                        movement=movement,
+                    )
+                    yield (
+                        f"get_moveable_spaces[{size}x{size},movement={movement}]",
+                        measure(piece.get_moveable_spaces, repeat=repeat),
+                    )
+
+            for size, piece_count in board_pieces:
+                board = create_bench_game(size, piece_count).board
+                yield (
+                    f"get_random_unoccupied_location[{size}x{size},pieces={piece_count}]",
+                    measure(board.get_random_unoccupied_location, repeat=repeat),
+                )
+
+            yield (
+                "Game.create",
+                measure(
+                    Game.create,
+                    repeat=repeat,
+                    setup=lambda: (
+                        Room.objects.create(name=f"bench-{next(unique_ids)}"),
+                    ),
+                ),
+            )
+
+            def add_occupant_setup():
+                room = Room.objects.create(name=f"bench-{next(unique_ids)}")
+                Game.create(room)
+                user = User.objects.create(username=f"bench-{next(unique_ids)}")
+                return room, user
+
+            yield (
+                "Room.add_occupant",
+                measure(Room.add_occupant, repeat=repeat, setup=add_occupant_setup),
+            )
+
+            mixin = RoomInfoMixin()
+            for size, piece_count in board_pieces:
+                game = create_bench_game(size, piece_count)
+                room = (
+                    Room.objects.filter(pk=game.room_id)
+                    .prefetch_related(*GAME_INFO_PREFETCH)
+                    .first()
+                )
+                yield (
+                    f"get_game_info_message[{size}x{size},pieces={piece_count}]",
+                    measure(
+                        mixin.get_game_info_message,
+                        repeat=repeat,
+                        setup=lambda: (room.game,),
+                    ),
+                )
+
+            transaction.set_rollback(True)
@@ -0,0 +1,69 @@
+from django.db import transaction
+from chat import packed_board
+from chat.bench import BenchCommand, measure, measure_allocations
+from chat.management.commands.bench_models import create_bench_game
+
+BOARD_PIECES = [(100, 1000), (200, 10000)]
+
+
+class Command(BenchCommand):
+    help = (
+        "Benchmark loading a board from its GamePiece rows against the packed "
+        "GameBoard column"
+    )
+    suite = "packed_board"
+
+    def run_benchmarks(self, options):
+        repeat = options["repeat"]
+        board_pieces = BOARD_PIECES[:1] if options["quick"] else BOARD_PIECES
+
+        with transaction.atomic():
+            for size, piece_count in board_pieces:
+                board = create_bench_game(size, piece_count).board
+                loads = {
+                    # One model instance per piece, as the prefetching
+                    # handlers load them.
+                    "models": lambda: list(board.gamepiece_set.select_related("owner")),
+                    "values_list": lambda: list(
+                        board.gamepiece_set.values_list(*packed_board.FIELDS)
+                    ),
+                    "packed": lambda: packed_board.view(board.load_packed_pieces()),
+                    "packed_tuples": lambda: list(
+                        packed_board.iter_pieces(board.load_packed_pieces())
+                    ),
+                }
+                case = f"{size}x{size},pieces={piece_count}"
+                for name, load in loads.items():
+                    yield (f"load[{name},{case}]", measure(load, repeat=repeat))
+                    yield (
+                        f"load_allocations[{name},{case}]",
+                        measure_allocations(load, repeat=repeat),
+                    )
+
+                yield (
+                    f"occupied_spaces[values_list,{case}]",
+                    measure(
+                        lambda: set(board.gamepiece_set.values_list("col", "row")),
+                        repeat=repeat,
+                    ),
+                )
+                yield (
+                    f"occupied_spaces[packed,{case}]",
+                    measure(board.get_occupied_spaces, repeat=repeat),
+                )
+
+                # What every move and placement now pays to keep the column
+                # in sync.
+                piece_id, col, row = board.gamepiece_set.values_list(
+                    "id", "col", "row"
+                ).last()
+                yield (
+                    f"update_packed_move[{case}]",
+                    measure(
+                        board.update_packed_pieces,
+                        repeat=repeat,
+                        setup=lambda: (packed_board.move_piece, piece_id, col, row),
+                    ),
+                )
+
+            transaction.set_rollback(True)
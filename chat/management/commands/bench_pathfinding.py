@@ -0,0 +1,91 @@
+import random
+from chat.bench import BenchCommand, measure
+from chat.pathfinding import Grid, PathCache, astar, dijkstra, reachable_spaces
+
+BOARD_SIZES = [100, 500, 1000]
+PIECE_COUNTS = [100, 10000, 100000]
+MOVEMENTS = [4, 20]
+TARGET_COUNT = 10
+TARGET_RADIUS = 50
+
+
+class BenchBoard:
+    def __init__(self, grid: Grid, board_id: int):
+        self.id = board_id
+        self.cols = grid.cols
+        self.rows = grid.rows
+        self.version = 0
+        self.occupied_spaces = grid.blocked
+
+    def get_occupied_spaces(self):
+        return self.occupied_spaces
+
+
+def random_grid(size: int, piece_count: int) -> Grid:
+    cells = random.sample(range(size * size), piece_count + 2)
+    return Grid(size, size, [(cell % size, cell // size) for cell in cells[2:]])
+
+
+def random_free_space(grid: Grid, near=None):
+    while True:
+        if near is None:
+            space = (random.randrange(grid.cols), random.randrange(grid.rows))
+        else:
+            space = (
+                near[0] + random.randint(-TARGET_RADIUS, TARGET_RADIUS),
+                near[1] + random.randint(-TARGET_RADIUS, TARGET_RADIUS),
+            )
+        if grid.passable(space):
+            return space
+
+
+class Command(BenchCommand):
+    help = "Benchmark A*, Dijkstra and the per-turn path cache"
+    suite = "pathfinding"
+
+    def run_benchmarks(self, options):
+        repeat = options["repeat"]
+        sizes = BOARD_SIZES[:1] if options["quick"] else BOARD_SIZES
+        piece_counts = PIECE_COUNTS[:1] if options["quick"] else PIECE_COUNTS
+        random.seed(0)
+
+        for size in sizes:
+            for piece_count in piece_counts:
+                if piece_count * 4 > size * size:
+                    continue
+                grid = random_grid(size, piece_count)
+                case = f"{size}x{size},pieces={piece_count}"
+                start = random_free_space(grid)
+                goal = random_free_space(grid)
+                targets = [
+                    random_free_space(grid, near=start) for _i in range(TARGET_COUNT)
+                ]
+
+                yield (
+                    f"astar[{case}]",
+                    measure(lambda: astar(grid, start, goal), repeat=repeat),
+                )
+                yield (
+                    f"dijkstra[{case},targets={TARGET_COUNT}@{TARGET_RADIUS}]",
+                    measure(lambda: dijkstra(grid, start, targets), repeat=repeat),
+                )
+                for movement in MOVEMENTS:
+                    yield (
+                        f"reachable_spaces[{case},movement={movement}]",
+                        measure(
+                            lambda: reachable_spaces(grid, start, movement),
+                            repeat=repeat,
+                        ),
+                    )
+
+                cache = PathCache()
+                board = BenchBoard(grid, board_id=size)
+                cache.get_path(board, start, goal)
+                yield (
+                    f"PathCache.get_path[{case},hit]",
+                    measure(
+                        lambda: cache.get_path(board, start, goal),
+                        repeat=repeat,
+                        number=1000,
+                    ),
+                )
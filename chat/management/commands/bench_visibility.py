@@ -0,0 +1,104 @@
+import random
+from chat.bench import BenchCommand, measure
+from chat.unit_classes import unit_classes
+from chat.visibility import RoomVisibility
+
+BOARD_PIECES = [(20, 30), (100, 1000)]
+PLAYER_COUNT = 3
+
+
+def make_game_info(size: int, piece_count: int) -> dict:
+    cells = random.sample(range(size * size), piece_count)
+    class_names = sorted(unit_classes)
+    return {
+        "type": "game_info",
+        "game": {
+            "state": "playing",
+            "players": [{"name": f"player-{i}"} for i in range(PLAYER_COUNT)],
+            "currentPlayer": "player-0",
+            "requiredPlayers": 2,
+            "grid": {"cols": size, "rows": size},
+            "boardPieces": [
+                {
+                    "id": piece_id,
+                    "name": f"piece-{piece_id}",
+                    "className": class_names[piece_id % len(class_names)],
+                    "col": cell % size,
+                    "row": cell // size,
+                    "player": {"name": f"player-{piece_id % PLAYER_COUNT}"},
+                    "moveableSpaces": [],
+                }
+                for piece_id, cell in enumerate(cells)
+            ],
+        },
+    }
+
+
+def move_one_piece(message: dict) -> dict:
+    # A copy of message with its first piece moved to a free cell.
+    game = message["game"]
+    size = game["grid"]["cols"]
+    occupied = {(piece["col"], piece["row"]) for piece in game["boardPieces"]}
+    col, row = next(
+        (col, row)
+        for col in range(size)
+        for row in range(size)
+        if (col, row) not in occupied
+    )
+    pieces = [{**game["boardPieces"][0], "col": col, "row": row}]
+    return {
+        **message,
+        "game": {**game, "boardPieces": pieces + game["boardPieces"][1:]},
+    }
+
+
+class Command(BenchCommand):
+    help = "Benchmark computing and caching each player's fog of war view"
+    suite = "visibility"
+
+    def run_benchmarks(self, options):
+        random.seed(0)
+        repeat = options["repeat"]
+        board_pieces = BOARD_PIECES[:1] if options["quick"] else BOARD_PIECES
+        players = [f"player-{i}" for i in range(PLAYER_COUNT)]
+
+        for size, piece_count in board_pieces:
+            message = make_game_info(size, piece_count)
+            moved = move_one_piece(message)
+            case = f"{size}x{size},pieces={piece_count}"
+
+            def from_scratch():
+                room = RoomVisibility(size, size)
+                room.update(message)
+                for player in players:
+                    room.get_view(player, message)
+
+            def after_move_setup():
+                room = RoomVisibility(size, size)
+                room.update(message)
+                for player in players:
+                    room.get_view(player, message)
+                return (room,)
+
+            def after_move(room):
+                room.update(moved)
+                for player in players:
+                    room.get_view(player, moved)
+
+            def unchanged(room):
+                room.update(message)
+                for player in players:
+                    room.get_view(player, message)
+
+            yield (
+                f"views_from_scratch[{case}]",
+                measure(from_scratch, repeat=repeat),
+            )
+            yield (
+                f"views_after_one_move[{case}]",
+                measure(after_move, repeat=repeat, setup=after_move_setup),
+            )
+            yield (
+                f"views_unchanged[{case}]",
+                measure(unchanged, repeat=repeat, setup=after_move_setup),
+            )
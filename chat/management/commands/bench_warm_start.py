@@ -0,0 +1,109 @@
+import random
+from itertools import count
+from django.db import transaction
+from chat.bench import BenchCommand, measure
+from chat.hot_state import get_active_games, warm_start
+from chat.models import Room, Player, GameBoard, GamePiece, Game
+from chat.pathfinding import path_cache
+from chat.turn_order import turn_orders
+
+GAME_COUNTS = [1000, 10000, 50000]
+BOARD_SIZE = 20
+PLAYERS_PER_GAME = 3
+
+unique_ids = count()
+
+
+def create_bench_games(game_count: int):
+    # Bulk inserts rather than Game.create, which would spend most of the
+    # setup time on the event log.
+    rooms = Room.objects.bulk_create(
+        [Room(name=f"bench-{next(unique_ids)}") for _i in range(game_count)]
+    )
+    boards = GameBoard.objects.bulk_create(
+        [GameBoard(rows=BOARD_SIZE, cols=BOARD_SIZE) for _i in range(game_count)]
+    )
+    games = Game.objects.bulk_create(
+        [
+            Game(room=room, board=board, state="playing")
+            for room, board in zip(rooms, boards)
+        ]
+    )
+    players = Player.objects.bulk_create(
+        [
+            Player(name=f"bench-{order}", order=order, game=game)
+            for game in games
+            for order in range(PLAYERS_PER_GAME)
+        ]
+    )
+    pieces = []
+    for game_index, game in enumerate(games):
+        cells = random.sample(range(BOARD_SIZE * BOARD_SIZE), PLAYERS_PER_GAME)
+        for player, cell in zip(
+            players[
+                game_index * PLAYERS_PER_GAME : (game_index + 1) * PLAYERS_PER_GAME
+            ],
+            cells,
+        ):
+            pieces.append(
+                GamePiece(
+                    owner=player,
+                    board=game.board,
+                    name=player.name,
+                    col=cell % BOARD_SIZE,
+                    row=cell // BOARD_SIZE,
+                )
+            )
+    GamePiece.objects.bulk_create(pieces)
+
+
+def clear_caches():
+    turn_orders.games.clear()
+    path_cache.boards.clear()
+
+
+def load_lazily():
+    # What the first request to each game paid before the warm start: its
+    # own prefetch, then its ring and grid.
+    for game_id in get_active_games().values_list("id", flat=True):
+        game = (
+            Game.objects.select_related("board")
+            .prefetch_related("player_set__user__client")
+            .get(pk=game_id)
+        )
+        game.get_turn_order()
+        path_cache.get_grid(game.board)
+
+
+class Command(BenchCommand):
+    help = "Benchmark loading every active game's hot state at worker startup"
+    suite = "warm_start"
+
+    def run_benchmarks(self, options):
+        random.seed(0)
+        repeat = options["repeat"]
+        game_counts = GAME_COUNTS[:1] if options["quick"] else GAME_COUNTS
+
+        with transaction.atomic():
+            created = 0
+            for game_count in game_counts:
+                create_bench_games(game_count - created)
+                created = game_count
+
+                def warm():
+                    clear_caches()
+                    warm_start.run()
+
+                def lazy():
+                    clear_caches()
+                    load_lazily()
+
+                yield (f"warm_start[games={game_count}]", measure(warm, repeat=repeat))
+                yield (
+                    f"first_request_per_game[games={game_count}]",
+                    # One game at a time is slow enough that one sample will do.
+                    measure(lazy, repeat=1),
+                )
+
+            clear_caches()
+            transaction.set_rollback(True)
@@ -0,0 +1,67 @@
+from django.core.management.base import BaseCommand, CommandError
+from chat.models import Room
+from chat.projections import load_game_info_message
+from chat.viewport import Viewport
+from chat.ws_message_handlers import GAME_INFO_PREFETCH, RoomInfoMixin
+
+
+def normalize(message: dict) -> dict:
+    # Neither path orders pieces or moveable spaces, so compare them as sets.
+    game = message["game"]
+    return {
+        **message,
+        "game": {
+            **game,
+            "boardPieces": sorted(
+                (
+                    {**piece, "moveableSpaces": sorted(piece["moveableSpaces"])}
+                    for piece in game["boardPieces"]
+                ),
+                key=lambda piece: piece["id"],
+            ),
+        },
+    }
+
+
+def get_viewports(cols: int, rows: int) -> list:
+    return [
+        None,
+        Viewport(0, 0, cols, rows),
+        Viewport(0, 0, max(1, cols // 2), max(1, rows // 2)),
+        Viewport(cols // 2, rows // 2, cols, rows),
+    ]
+
+
+class Command(BaseCommand):
+    help = (
+        "Check that projections.load_game_info_message matches the game_info "
+        "built from prefetched models for every room"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--room", default=None, help="Only check this room")
+
+    def handle(self, *args, **options):
+        rooms = Room.objects.filter(game__isnull=False).prefetch_related(
+            *GAME_INFO_PREFETCH
+        )
+        if options["room"]:
+            rooms = rooms.filter(name=options["room"])
+
+        mixin = RoomInfoMixin()
+        checked = 0
+        mismatches = []
+        for room in rooms:
+            board = room.game.board
+            for viewport in get_viewports(board.cols, board.rows):
+                expected = mixin.get_game_info_message(room.game, viewport)
+                actual = load_game_info_message(room.name, viewport)
+                if actual is None or normalize(actual) != normalize(expected):
+                    mismatches.append((room.name, viewport))
+                checked += 1
+
+        for room_name, viewport in mismatches:
+            self.stderr.write(f"Mismatch in {room_name} with viewport {viewport}")
+        if mismatches:
+            raise CommandError(f"{len(mismatches)} of {checked} checks differ")
+        self.stdout.write(f"{checked} checks match")
@@ -0,0 +1,272 @@
+import asyncio
+import cProfile
+import io
+import pstats
+import threading
+import time
+from collections import Counter, defaultdict, deque
+from channels.testing import WebsocketCommunicator
+from django.core.management.base import BaseCommand, CommandError
+from chat import encoding, ws_message_handlers
+from chat.traffic import read_traffic, CONNECTED, DISCONNECTED, INBOUND, OUTBOUND
+
+HEADERS = [(b"origin", b"http://localhost")]
+# Names the server hands out that later messages refer to. The recorded and
+# live values differ, so they are paired up in the order the server sent them.
+REPLY_FIELDS = {
+    "client_created": "client_name",
+    "authenticated": "username",
+    "joined_room": "room_name",
+}
+NAME_TIMEOUT = 5
+SETTLE_TIME = 0.5
+
+
+def get_replies(frame: str) -> list:
+    message = encoding.loads(frame)
+    if message.get("type") == "batch":
+        return message["messages"]
+    return [message]
+
+
+def get_requests(data: dict) -> list:
+    if "batch" in data:
+        return [message for message in data["batch"] if isinstance(message, dict)]
+    return [data["message"]] if isinstance(data.get("message"), dict) else []
+
+
+class NameMap:
+    def __init__(self):
+        self.names = {field: {} for field in REPLY_FIELDS.values()}
+        # When each recorded name was first handed out; clients may also
+        # pick names themselves (join_room), which must not be waited for.
+        self.introduced = {field: {} for field in REPLY_FIELDS.values()}
+        self.pending = defaultdict(deque)
+        self.changed = asyncio.Condition()
+
+    def expect(self, timestamp: float, connection: str, frame: str):
+        for message in get_replies(frame):
+            field = REPLY_FIELDS.get(message.get("type"))
+            if field and field in message:
+                self.pending[(connection, message["type"])].append(message[field])
+                self.introduced[field].setdefault(message[field], timestamp)
+
+    async def observe(self, connection: str, frame: str):
+        for message in get_replies(frame):
+            field = REPLY_FIELDS.get(message.get("type"))
+            pending = self.pending.get((connection, message.get("type")))
+            if field and pending and field in message:
+                self.names[field][pending.popleft()] = message[field]
+                async with self.changed:
+                    self.changed.notify_all()
+
+    async def translate(self, timestamp: float, data: dict) -> str:
+        for message in get_requests(data):
+            await self.translate_message(timestamp, message)
+        return encoding.dumps(data)
+
+    async def translate_message(self, timestamp: float, message: dict):
+        for field, names in self.names.items():
+            value = message.get(field)
+            introduced = self.introduced[field].get(value)
+            if introduced is not None and introduced < timestamp and value not in names:
+                # The reply that hands out this name is still on its way.
+                async with self.changed:
+                    try:
+                        await asyncio.wait_for(
+                            self.changed.wait_for(lambda: value in names),
+                            NAME_TIMEOUT,
+                        )
+                    except asyncio.TimeoutError:
+                        pass
+            if value in names:
+                message[field] = names[value]
+
+
+class Replay:
+    def __init__(self, application, events: list, speed: float):
+        self.application = application
+        self.events = events
+        self.speed = speed
+        self.names = NameMap()
+        self.communicators = {}
+        self.readers = []
+        self.sent = Counter()
+        self.received = Counter()
+
+    async def run(self) -> float:
+        for timestamp, connection, direction, frame in self.events:
+            if direction == OUTBOUND:
+                self.names.expect(timestamp, connection, frame)
+
+        start = time.perf_counter()
+        first_timestamp = self.events[0][0]
+        for timestamp, connection, direction, frame in self.events:
+            if self.speed:
+                delay = (timestamp - first_timestamp) / self.speed - (
+                    time.perf_counter() - start
+                )
+                if delay > 0:
+                    await asyncio.sleep(delay)
+
+            if direction == CONNECTED:
+                await self.connect(connection)
+            elif direction == INBOUND and connection in self.communicators:
+                data = encoding.loads(frame)
+                for message in get_requests(data):
+                    self.sent[message.get("type")] += 1
+                await self.communicators[connection].send_to(
+                    text_data=await self.names.translate(timestamp, data)
+                )
+            elif direction == DISCONNECTED and connection in self.communicators:
+                await self.communicators.pop(connection).disconnect()
+
+        # Let the last replies and broadcasts go out before closing up.
+        await asyncio.sleep(SETTLE_TIME)
+        for communicator in self.communicators.values():
+            await communicator.disconnect()
+        for reader in self.readers:
+            reader.cancel()
+        return time.perf_counter() - start
+
+    async def connect(self, connection: str):
+        communicator = WebsocketCommunicator(
+            self.application, "/ws/friends/", headers=HEADERS
+        )
+        connected, _subprotocol = await communicator.connect()
+        if not connected:
+            raise CommandError("The application rejected the connection")
+        self.communicators[connection] = communicator
+        self.readers.append(asyncio.create_task(self.read(connection, communicator)))
+
+    async def read(self, connection: str, communicator: WebsocketCommunicator):
+        # Reads the output queue directly: receive_from cancels the
+        # application when it times out.
+        while True:
+            message = await communicator.output_queue.get()
+            if message["type"] != "websocket.send" or "text" not in message:
+                continue
+            for reply in get_replies(message["text"]):
+                self.received[reply.get("type")] += 1
+            await self.names.observe(connection, message["text"])
+
+
+class ThreadProfilers:
+    # cProfile only sees the thread it was enabled in, and the handlers do
+    # their database work in asgiref's executor threads. This enables one
+    # more profiler in every thread started while it is active.
+    def __init__(self):
+        self.profilers = [cProfile.Profile()]
+
+    def start(self):
+        threading.setprofile(self.start_in_thread)
+        self.profilers[0].enable()
+
+    def start_in_thread(self, *args):
+        profiler = cProfile.Profile()
+        self.profilers.append(profiler)
+        profiler.enable()
+
+    def stop(self) -> pstats.Stats:
+        threading.setprofile(None)
+        self.profilers[0].disable()
+        stats = pstats.Stats(self.profilers[0])
+        for profiler in self.profilers[1:]:
+            stats.add(profiler)
+        return stats
+
+
+class Command(BaseCommand):
+    help = (
+        "Replay websocket traffic recorded with TRAFFIC_RECORDING_PATH against "
+        "this instance and print the handlers' hot spots. Ids that depend on "
+        "the database, such as piece ids, are sent as recorded. For a sampling "
+        "profiler run this under py-spy with --profiler none."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("log", help="Recorded traffic log")
+        parser.add_argument(
+            "--speed",
+            type=float,
+            default=1.0,
+            help="Playback speed; 1 is real time and 0 is as fast as possible",
+        )
+        parser.add_argument(
+            "--profiler", choices=["cprofile", "none"], default="cprofile"
+        )
+        parser.add_argument("--limit", type=int, default=25)
+        parser.add_argument(
+            "--stats-file", default=None, help="Also dump the raw cProfile stats"
+        )
+
+    def handle(self, *args, **options):
+        events = sorted(read_traffic(options["log"]), key=lambda event: event[0])
+        if not events:
+            raise CommandError(f"No traffic in {options['log']}")
+
+        from friends_backend.asgi import application
+
+        replay = Replay(application, events, options["speed"])
+        profilers = ThreadProfilers() if options["profiler"] == "cprofile" else None
+        if profilers:
+            profilers.start()
+        elapsed = asyncio.run(replay.run())
+        stats = profilers.stop() if profilers else None
+
+        self.stdout.write(
+            f"Replayed {sum(replay.sent.values())} messages on "
+            f"{len({event[1] for event in events})} connections in {elapsed:.2f}s"
+        )
+        self.write_counts("Sent", replay.sent)
+        self.write_counts("Received", replay.received)
+        if stats is None:
+            return
+
+        if options["stats_file"]:
+            stats.dump_stats(options["stats_file"])
+        self.write_handler_stats(stats)
+        self.write_stats(
+            "Hot spots in chat by own time",
+            stats,
+            "tottime",
+            r"chat/(?!management)",
+            options["limit"],
+        )
+
+    def write_counts(self, title: str, counts: Counter):
+        self.stdout.write(f"\n{title}:")
+        for message_type, count in counts.most_common():
+            self.stdout.write(f"  {message_type:<30} {count:>8}")
+
+    def write_handler_stats(self, stats: pstats.Stats):
+        # pstats only knows the handlers as "handle", so name them by class.
+        handlers = {
+            (
+                handler.handle.__code__.co_filename,
+                handler.handle.__code__.co_firstlineno,
+                "handle",
+            ): type(handler).__name__
+            for handler in ws_message_handlers.HANDLERS
+        }
+        rows = sorted(
+            (
+                (handlers[key], calls, cumulative)
+                for key, (_cc, calls, _tottime, cumulative, _callers) in (
+                    stats.stats.items()
+                )
+                if key in handlers
+            ),
+            key=lambda row: row[2],
+            reverse=True,
+        )
+        self.stdout.write("\nHandlers by cumulative time on the event loop:")
+        for name, calls, cumulative in rows:
+            self.stdout.write(f"  {name:<30} {calls:>8} {cumulative * 1000:>10.2f}ms")
+
+    def write_stats(self, title, stats, sort, restriction, limit):
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats(sort).print_stats(restriction, limit)
+        self.stdout.write(f"\n{title}:")
+        self.stdout.write(output.getvalue())
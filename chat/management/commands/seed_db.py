@@ -1,17 +1,25 @@
 from django.core.management.base import BaseCommand
-from chat.models import Room, Game
+from chat.models import Room, Game, DEFAULT_BOARD_SIZE
 from django.contrib.auth.models import User
 
 
 class Command(BaseCommand):
     help = "Seed the database"
 
+    def add_arguments(self, parser):
+        parser.add_argument("--cols", type=int, default=DEFAULT_BOARD_SIZE)
+        parser.add_argument("--rows", type=int, default=DEFAULT_BOARD_SIZE)
+
     def handle(self, *args, **options):
         User.objects.all().delete()
         Room.objects.all().delete()
         Game.objects.all().delete()
 
-        ellios_room, created = Room.objects.get_or_create(name="ellios")
+        ellios_room, created = Room.objects.get_or_create(
+            name="ellios",
+            board_cols=options["cols"],
+            board_rows=options["rows"],
+        )
         for room in Room.objects.all():
             room.occupants.clear()
         Game.create(ellios_room)
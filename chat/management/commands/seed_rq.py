@@ -2,7 +2,11 @@ from django.core.management.base import BaseCommand
 
 from django_rq import get_scheduler, get_queue
 from django.utils import timezone
-from chat.rq_jobs import clean_up_clients
+from chat.rq_jobs import (
+    archive_finished_games,
+    clean_up_clients,
+    maintain_room_pool,
+)
 
 
 class Command(BaseCommand):
@@ -19,3 +23,13 @@ class Command(BaseCommand):
             func=clean_up_clients,
             interval=60,
         )
+        scheduler.schedule(
+            scheduled_time=timezone.now(),
+            func=maintain_room_pool,
+            interval=30,
+        )
+        scheduler.schedule(
+            scheduled_time=timezone.now(),
+            func=archive_finished_games,
+            interval=300,
+        )
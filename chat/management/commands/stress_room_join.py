@@ -0,0 +1,136 @@
+import random
+import threading
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, IntegrityError, OperationalError
+from django.db.models import Count
+from chat import packed_board
+from chat.models import Room, Game, GamePiece, Player, REQUIRED_PLAYER_COUNT
+
+PREFIX = "stress-"
+# SQLite reports lock contention as an error instead of waiting it out.
+LOCKED_RETRIES = 50
+
+
+def join_and_leave(user_id: int, room_ids: list[int], options: dict, start, results):
+    rng = random.Random(user_id)
+    user = User.objects.get(pk=user_id)
+    start.wait()
+    try:
+        for _i in range(options["attempts"]):
+            room = Room.objects.select_related("game__board").get(
+                pk=rng.choice(room_ids)
+            )
+            outcome = retry_locked(lambda: join(room, user), results)
+            results[outcome] += 1
+            if outcome == "joined" and rng.random() < options["leave_rate"]:
+                retry_locked(lambda: room.remove_occupant(user), results)
+                results["left"] += 1
+    finally:
+        connection.close()
+
+
+def join(room: Room, user: User) -> str:
+    try:
+        if room.add_occupant(user):
+            return "joined"
+        return "full"
+    except IntegrityError:
+        return "already seated"
+
+
+def retry_locked(attempt, results):
+    for _i in range(LOCKED_RETRIES):
+        try:
+            return attempt()
+        except OperationalError:
+            results["locked retries"] += 1
+    raise CommandError("Gave up on a locked database")
+
+
+class Command(BaseCommand):
+    help = (
+        "Join and leave a few rooms from many threads at once, then check that "
+        "no room was overfilled, no turn order was taken twice and every "
+        "packed board matches its pieces. Run it against the production "
+        "database engine; SQLite serializes writers."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rooms", type=int, default=20)
+        parser.add_argument("--users", type=int, default=200)
+        parser.add_argument("--threads", type=int, default=32)
+        parser.add_argument("--attempts", type=int, default=5)
+        parser.add_argument("--leave-rate", type=float, default=0.3)
+
+    def handle(self, *args, **options):
+        room_ids = []
+        for _i in range(options["rooms"]):
+            room = Room.objects.create(name=f"{PREFIX}{random.getrandbits(48):x}")
+            Game.create(room)
+            room_ids.append(room.id)
+        user_ids = [
+            User.objects.create(username=f"{PREFIX}{random.getrandbits(48):x}").id
+            for _i in range(options["users"])
+        ]
+
+        results = Counter()
+        start = threading.Event()
+        try:
+            with ThreadPoolExecutor(options["threads"]) as executor:
+                futures = [
+                    executor.submit(
+                        join_and_leave, user_id, room_ids, options, start, results
+                    )
+                    for user_id in user_ids
+                ]
+                start.set()
+                for future in futures:
+                    future.result()
+            problems = self.check_rooms(room_ids)
+        finally:
+            Room.objects.filter(pk__in=room_ids).delete()
+            User.objects.filter(pk__in=user_ids).delete()
+
+        for outcome, count in results.most_common():
+            self.stdout.write(f"  {outcome:<20} {count:>8}")
+        if problems:
+            raise CommandError("\n".join(problems))
+        self.stdout.write(self.style.SUCCESS(f"{len(room_ids)} rooms consistent"))
+
+    def check_rooms(self, room_ids: list[int]) -> list[str]:
+        problems = []
+        for room in (
+            Room.objects.filter(pk__in=room_ids)
+            .annotate(occupants_total=Count("occupants"))
+            .select_related("game__board")
+        ):
+            if room.occupants_total > REQUIRED_PLAYER_COUNT:
+                problems.append(f"{room.name} has {room.occupants_total} occupants")
+            if room.occupants_total != room.occupant_count:
+                problems.append(
+                    f"{room.name} counts {room.occupant_count} occupants "
+                    f"but has {room.occupants_total}"
+                )
+            humans = Player.objects.filter(game__room=room, user__isnull=False)
+            if humans.count() != room.occupants_total:
+                problems.append(
+                    f"{room.name} has {humans.count()} players for "
+                    f"{room.occupants_total} occupants"
+                )
+            board = room.game.board
+            if sorted(packed_board.iter_pieces(board.load_packed_pieces())) != sorted(
+                GamePiece.objects.filter(board=board).values_list(*packed_board.FIELDS)
+            ):
+                problems.append(f"{room.name} has a stale packed board")
+        taken_twice = (
+            Player.objects.filter(game__room_id__in=room_ids)
+            .values("game_id", "order")
+            .annotate(players=Count("id"))
+            .filter(players__gt=1)
+        )
+        for row in taken_twice:
+            problems.append(f"Game {row['game_id']} has order {row['order']} twice")
+        return problems
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import uuid
+from channels.db import database_sync_to_async
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction, DatabaseError, IntegrityError
+from chat import encoding, lobby
+from chat.broadcast import LOW_PRIORITY
+from chat.models import Room, Game, REQUIRED_PLAYER_COUNT
+
+logger = logging.getLogger(__name__)
+
+
+def claim_or_create_room() -> Room:
+    room = Room.claim_pooled()
+    if room is None:
+        room = Room.objects.create(name=f"match-{uuid.uuid4().hex[:12]}")
+        Game.create(room)
+    return room
+
+
+def seat_users(
+    user_ids: list[int],
+) -> tuple[list[tuple[dict, list[int], bool]], list[int]]:
+    # Returns (room summary, seated user ids, room was created) per room, and
+    # the ids of users that could not be seated this time and should queue
+    # again. Users that joined a room some other way while queued are in
+    # neither.
+    users = list(
+        User.objects.filter(id__in=user_ids, player__isnull=True).order_by("id")
+    )
+    if not users:
+        return [], []
+
+    open_rooms = (
+        Room.objects.filter(
+            pooled_at__isnull=True, occupant_count__lt=REQUIRED_PLAYER_COUNT
+        )
+        .order_by("id")
+        .values_list("id", "occupant_count")
+    )
+    groups = []
+    for room_id, occupant_count in open_rooms.iterator():
+        if not users:
+            break
+        free_seats = REQUIRED_PLAYER_COUNT - occupant_count
+        groups.append((room_id, occupant_count, users[:free_seats]))
+        users = users[free_seats:]
+    while users:
+        groups.append((None, 0, users[:REQUIRED_PLAYER_COUNT]))
+        users = users[REQUIRED_PLAYER_COUNT:]
+
+    seated = []
+    retry = []
+    for room_id, occupant_count, group in groups:
+        try:
+            with transaction.atomic():
+                if room_id is None:
+                    room = claim_or_create_room()
+                else:
+                    room = Room.objects.select_related("game__board").get(pk=room_id)
+                if not room.add_occupants(group):
+                    # Filled up by joins since it was counted.
+                    retry.extend(user.id for user in group)
+                    continue
+        except IntegrityError:
+            # Someone in the group got seated elsewhere in the meantime, so
+            # the whole group is rolled back. That user drops out next time.
+            retry.extend(user.id for user in group)
+            continue
+        except DatabaseError:
+            logger.exception("Seating a matchmaking group failed")
+            retry.extend(user.id for user in group)
+            continue
+        seated.append(
+            (
+                lobby.to_room_summary(room.name, occupant_count + len(group)),
+                [user.id for user in group],
+                room_id is None,
+            )
+        )
+    return seated, retry
+
+
+class Matchmaker:
+    def __init__(self):
+        self.queue: dict[int, str] = {}
+        # The batch being seated, off the queue but still cancellable.
+        self.seating: dict[int, str] = {}
+        self.task = None
+
+    def enqueue(self, user_id: int, channel_name: str):
+        self.queue[user_id] = channel_name
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self.run())
+
+    def cancel(self, user_id: int) -> bool:
+        queued = self.queue.pop(user_id, None) is not None
+        return self.seating.pop(user_id, None) is not None or queued
+
+    async def run(self):
+        while self.queue:
+            await asyncio.sleep(settings.MATCHMAKING_INTERVAL)
+            try:
+                await self.match_batch()
+            except Exception:
+                # Keep matching whoever is still queued.
+                logger.exception("Matchmaking batch failed")
+
+    async def match_batch(self):
+        batch = {}
+        for user_id in list(self.queue)[: settings.MATCHMAKING_BATCH_SIZE]:
+            batch[user_id] = self.queue.pop(user_id)
+        channel_names = dict(batch)
+
+        self.seating = batch
+        try:
+            seated, retry = await database_sync_to_async(seat_users)(list(batch))
+        except Exception:
+            # Groups fail on their own inside seat_users, so this is before
+            # anyone was seated; the whole batch queues again.
+            logger.exception("Seating %d matchmaking users failed", len(batch))
+            seated, retry = [], list(batch)
+        finally:
+            self.seating = {}
+
+        channel_layer = get_channel_layer()
+        for summary, user_ids, created in seated:
+            for user_id in user_ids:
+                batch.pop(user_id, None)
+                await channel_layer.send(
+                    channel_names[user_id],
+                    {
+                        "type": "matchmaking_matched",
+                        "room_name": summary["name"],
+                    },
+                )
+            await lobby.broadcast_lobby_event(
+                channel_layer,
+                lobby.ROOM_ADDED if created else lobby.ROOM_UPDATED,
+                summary,
+                # Seated users are told directly above; the lobby can wait.
+                priority=LOW_PRIORITY,
+            )
+
+        # Users cancelled while being seated are no longer in the batch.
+        requeued = {
+            user_id: batch.pop(user_id) for user_id in retry if user_id in batch
+        }
+        self.queue = {**requeued, **self.queue}
+
+        # The rest got into a room some other way while queued.
+        for channel_name in batch.values():
+            await channel_layer.send(
+                channel_name,
+                {
+                    "type": "forward_frame",
+                    "frame": encoding.error_frame(
+                        "matchmaking_failed", "User is already in a room"
+                    ),
+                },
+            )
+
+
+matchmaker = Matchmaker()
@@ -0,0 +1,84 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:02
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0016_gamepiece_class_name_gamepiece_movement"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="GameSnapshot",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("seq", models.IntegerField()),
+                ("state", models.JSONField()),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="chat.game"
+                    ),
+                ),
+            ],
+        ),
+        migrations.CreateModel(
+            name="GameEvent",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("seq", models.IntegerField()),
+                (
+                    "kind",
+                    models.CharField(
+                        choices=[
+                            ("join", "join"),
+                            ("leave", "leave"),
+                            ("place", "place"),
+                            ("move", "move"),
+                            ("state", "state"),
+                        ],
+                        max_length=255,
+                    ),
+                ),
+                ("payload", models.JSONField(default=dict)),
+                ("created_at", models.DateTimeField(auto_now_add=True)),
+                (
+                    "game",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE, to="chat.game"
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="gamesnapshot",
+            constraint=models.UniqueConstraint(
+                fields=("game", "seq"), name="unique_game_snapshot_seq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="gameevent",
+            constraint=models.UniqueConstraint(
+                fields=("game", "seq"), name="unique_game_event_seq"
+            ),
+        ),
+    ]
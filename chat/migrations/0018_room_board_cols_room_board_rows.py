@@ -0,0 +1,22 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:03
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0017_gamesnapshot_gameevent_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="board_cols",
+            field=models.IntegerField(default=10),
+        ),
+        migrations.AddField(
+            model_name="room",
+            name="board_rows",
+            field=models.IntegerField(default=10),
+        ),
+    ]
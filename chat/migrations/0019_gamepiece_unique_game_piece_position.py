@@ -0,0 +1,53 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:05
+
+import random
+from django.db import migrations, models
+
+
+def relocate_stacked_pieces(apps, schema_editor):
+    GamePiece = apps.get_model("chat", "GamePiece")
+    GameBoard = apps.get_model("chat", "GameBoard")
+    for board in GameBoard.objects.all():
+        taken = set()
+        stacked = []
+        for piece in GamePiece.objects.filter(board=board).order_by("id"):
+            if (piece.col, piece.row) in taken:
+                stacked.append(piece)
+            else:
+                taken.add((piece.col, piece.row))
+
+        free = [
+            (col, row)
+            for col in range(board.cols)
+            for row in range(board.rows)
+            if (col, row) not in taken
+        ]
+        if len(stacked) > len(free):
+            # Nothing is deleted to make room; the board has to be fixed by
+            # hand before this migration can run.
+            raise RuntimeError(
+                f"Board {board.id} has {len(stacked)} stacked pieces but only "
+                f"{len(free)} free cells. Stacked pieces (id, owner id): "
+                f"{[(piece.id, piece.owner_id) for piece in stacked]}"
+            )
+
+        random.shuffle(free)
+        for piece in stacked:
+            piece.col, piece.row = free.pop()
+            piece.save()
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0018_room_board_cols_room_board_rows"),
+    ]
+
+    operations = [
+        migrations.RunPython(relocate_stacked_pieces, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="gamepiece",
+            constraint=models.UniqueConstraint(
+                fields=("board", "col", "row"), name="unique_game_piece_position"
+            ),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:09
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0019_gamepiece_unique_game_piece_position"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="game",
+            name="roster_version",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name="game",
+            name="turn_order",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0020_game_roster_version_game_turn_order"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="pooled_at",
+            field=models.DateTimeField(null=True),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:37
+
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def count_occupants(apps, schema_editor):
+    Room = apps.get_model("chat", "Room")
+    for room in Room.objects.annotate(occupants_total=Count("occupants")):
+        room.occupant_count = room.occupants_total
+        room.save(update_fields=["occupant_count"])
+
+
+def renumber_colliding_orders(apps, schema_editor):
+    Player = apps.get_model("chat", "Player")
+    Game = apps.get_model("chat", "Game")
+    for game in Game.objects.all():
+        players = list(Player.objects.filter(game=game).order_by("order", "id"))
+        taken = {player.order for player in players}
+        seen = set()
+        for player in players:
+            if player.order in seen:
+                order = 0
+                while order in taken:
+                    order += 1
+                player.order = order
+                player.save()
+                taken.add(order)
+            seen.add(player.order)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0021_room_pooled_at"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="room",
+            name="occupant_count",
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(count_occupants, migrations.RunPython.noop),
+        migrations.RunPython(renumber_colliding_orders, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="player",
+            constraint=models.UniqueConstraint(
+                fields=("game", "order"), name="unique_player_order"
+            ),
+        ),
+    ]
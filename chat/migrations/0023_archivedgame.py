@@ -0,0 +1,31 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0022_room_occupant_count_player_unique_player_order"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ArchivedGame",
+            fields=[
+                (
+                    "id",
+                    models.BigAutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("game_id", models.IntegerField(unique=True)),
+                ("room_name", models.CharField(max_length=255)),
+                ("event_count", models.IntegerField()),
+                ("data", models.BinaryField()),
+                ("archived_at", models.DateTimeField(auto_now_add=True)),
+            ],
+        ),
+    ]
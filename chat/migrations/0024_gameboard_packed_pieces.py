@@ -0,0 +1,44 @@
+# Generated by Django 4.1.7 on 2026-10-19 12:41
+
+import sys
+from array import array
+from django.db import migrations, models
+
+# The chat.packed_board layout as of this migration, copied so later changes
+# to that module don't change what this one writes: one little-endian int32
+# record per piece, in this field order.
+FIELDS = ("id", "owner_id", "col", "row", "movement")
+
+
+def pack(pieces) -> bytes:
+    records = array("i")
+    for piece in pieces:
+        records.extend(piece)
+    if sys.byteorder == "big":
+        records.byteswap()
+    return records.tobytes()
+
+
+def pack_boards(apps, schema_editor):
+    GameBoard = apps.get_model("chat", "GameBoard")
+    GamePiece = apps.get_model("chat", "GamePiece")
+    for board in GameBoard.objects.all():
+        board.packed_pieces = pack(
+            GamePiece.objects.filter(board=board).order_by("id").values_list(*FIELDS)
+        )
+        board.save(update_fields=["packed_pieces"])
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0023_archivedgame"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gameboard",
+            name="packed_pieces",
+            field=models.BinaryField(default=bytes),
+        ),
+        migrations.RunPython(pack_boards, migrations.RunPython.noop),
+    ]
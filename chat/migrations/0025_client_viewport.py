@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0024_gameboard_packed_pieces"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="viewport",
+            field=models.JSONField(null=True),
+        ),
+    ]
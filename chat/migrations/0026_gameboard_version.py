@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-19 13:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0025_client_viewport"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="gameboard",
+            name="version",
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,17 @@
+# Generated by Django 4.1.7 on 2026-10-19 13:23
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("chat", "0026_gameboard_version"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="client",
+            name="spectating",
+            field=models.CharField(db_index=True, max_length=255, null=True),
+        ),
+    ]
@@ -1,7 +1,20 @@
 import random
-from django.db import models
+from django.db import models, transaction, IntegrityError
+from django.db.models import F, Max
 from django.contrib.auth.models import User
+from django.utils import timezone
 from typing import Tuple
+from chat import game_events, packed_board
+from chat.pathfinding import path_cache
+from chat.reachability import reachability_cache
+from chat.turn_order import TurnOrder, TurnOrderNode, turn_orders
+from chat.unit_classes import (
+    DEFAULT_UNIT_CLASS,
+    UnitClass,
+    get_range_mask,
+    get_unit_class,
+    translate,
+)
 
 
 class Client(models.Model):
@@ -10,40 +23,140 @@ class Client(models.Model):
     connection_time = models.DateTimeField(auto_now_add=True)
     last_authed_message_time = models.DateTimeField(auto_now_add=False, null=True)
     connected = models.BooleanField(default=True)
+    # The connection's subscribe_viewport rectangle, so broadcasts can cut
+    # game_info to it before it goes through the channel layer.
+    viewport = models.JSONField(null=True)
+    # The room this connection spectates, so fan-out can skip rooms nobody
+    # watches whichever worker their spectators are on.
+    spectating = models.CharField(max_length=255, null=True, db_index=True)
 
 
 REQUIRED_PLAYER_COUNT = 2
+DEFAULT_BOARD_SIZE = 10
 
 
 class Room(models.Model):
     name = models.CharField(max_length=255)
     occupants = models.ManyToManyField(User)
+    # Kept in step with occupants; the conditional update on it in
+    # add_occupants is what stops concurrent joins from overfilling a room.
+    occupant_count = models.IntegerField(default=0)
+    board_cols = models.IntegerField(default=DEFAULT_BOARD_SIZE)
+    board_rows = models.IntegerField(default=DEFAULT_BOARD_SIZE)
+    # Set while the room sits unclaimed in the pre-built pool.
+    pooled_at = models.DateTimeField(null=True)
+
+    @classmethod
+    def create_pooled(cls, name: str):
+        with transaction.atomic():
+            room = cls.objects.create(name=name, pooled_at=timezone.now())
+            Game.create(room)
+        return room
+
+    @classmethod
+    def claim_pooled(cls):
+        # The conditional update makes the claim atomic. A claim only misses
+        # when another worker took that room first, which shrinks the pool,
+        # so keep going until the pool is empty.
+        candidates = (
+            cls.objects.filter(pooled_at__isnull=False)
+            .order_by("pooled_at")
+            .values_list("id", flat=True)
+        )
+        while True:
+            room_id = candidates.first()
+            if room_id is None:
+                return None
+            if cls.objects.filter(pk=room_id, pooled_at__isnull=False).update(
+                pooled_at=None
+            ):
+                return cls.objects.select_related("game__board").get(pk=room_id)
 
     def is_full(self):
-        return self.occupants.count() >= REQUIRED_PLAYER_COUNT
+        return self.occupant_count >= REQUIRED_PLAYER_COUNT
 
     def ready_to_start_game(self):
         return self.is_full()
 
-    def add_occupant(self, user: User):
-        self.occupants.add(user)
-        self.save()
-        player = Player.objects.create(
-            user=user,
-            name=user.username,
-            game=self.game,
-            order=self.occupants.count() - 1,
+    def add_occupant(self, user: User) -> bool:
+        return self.add_occupants([user])
+
+    def add_occupants(self, users: list[User]) -> bool:
+        # Returns False if the room has no seats left for all of users. The
+        # seats are claimed with one conditional update, which holds the
+        # room's row lock until commit, so concurrent joins of the same room
+        # queue up behind it and see the new count; other rooms don't wait.
+        # A user who is seated elsewhere meanwhile raises IntegrityError.
+        with transaction.atomic():
+            if not Room.objects.filter(
+                pk=self.pk,
+                occupant_count__lte=REQUIRED_PLAYER_COUNT - len(users),
+            ).update(occupant_count=F("occupant_count") + len(users)):
+                return False
+            self.refresh_from_db(fields=["occupant_count"])
+            self.seat_occupants(users)
+        return True
+
+    def seat_occupants(self, users: list[User]):
+        self.occupants.add(*users)
+        players = Player.objects.bulk_create(
+            [
+                Player(
+                    user=user,
+                    name=user.username,
+                    game=self.game,
+                    order=order,
+                )
+                for user, order in zip(users, self.game.get_free_orders(len(users)))
+            ]
         )
-        GamePiece.create_at_random_location(player, player.name)
+        turn_order = self.game.bump_roster_version()
+        for player in players:
+            self.game.record_player_joined(player)
+            if turn_order is not None:
+                turn_order.add(player.id, player.name, player.order)
+            GamePiece.create_at_random_location(player, player.name)
         if self.ready_to_start_game():
-            self.game.state = "playing"
-            self.game.save()
+            self.game.set_state("playing")
 
     def remove_occupant(self, user: User):
-        self.occupants.remove(user)
-        self.save()
-        player = Player.objects.get(user=user)
-        player.delete()
+        # Only gives the seat back if the user's Player was actually removed,
+        # so a repeated or stale leave can't push the count below the seats
+        # taken.
+        with transaction.atomic():
+            self.occupants.remove(user)
+            if not self.remove_player(user):
+                return
+            Room.objects.filter(pk=self.pk, occupant_count__gt=0).update(
+                occupant_count=F("occupant_count") - 1
+            )
+            self.refresh_from_db(fields=["occupant_count"])
+
+    def remove_player(self, user: User) -> bool:
+        player = Player.objects.filter(user=user, game=self.game).first()
+        if player is None:
+            return False
+        player_id = player.id
+        vacated_spaces = list(player.gamepiece_set.values_list("col", "row"))
+        # A concurrent leave may have deleted the row since it was read.
+        _total, deleted = player.delete()
+        if not deleted.get(Player._meta.label):
+            return False
+        self.game.record_event(game_events.LEAVE, player=player_id)
+        old_version = self.game.board.update_packed_pieces(
+            packed_board.remove_owner, player_id
+        )
+        self.game.board.spaces_changed(vacated_spaces, old_version)
+        turn_order = self.game.bump_roster_version()
+        if turn_order is not None:
+            turn_order.remove(player_id)
+            # The turn passes to the next player who can take it, like when
+            # a player disconnects.
+            if turn_order.current is not None and not turn_order.current.can_act():
+                turn_order.advance()
+            if turn_order.current is not None:
+                self.game.set_turn_order(turn_order.current.order)
+        return True
 
 
 class Player(models.Model):
@@ -52,24 +165,123 @@ class Player(models.Model):
     order = models.IntegerField()
     game = models.ForeignKey("Game", on_delete=models.CASCADE)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["game", "order"],
+                name="unique_player_order",
+            ),
+        ]
+
     def get_name(self):
         return self.name
 
+    def is_automated(self) -> bool:
+        return self.user_id is None
+
+    def is_connected(self) -> bool:
+        # Relies on game__player_set__user__client being prefetched when
+        # called from async code.
+        if self.is_automated():
+            return True
+        return hasattr(self.user, "client") and self.user.client.connected
+
+
+RANDOM_LOCATION_PROBES = 32
+
 
 class GameBoard(models.Model):
     rows = models.IntegerField()
     cols = models.IntegerField()
+    # Every piece's packed_board.FIELDS, written in the same transaction as
+    # the GamePiece rows, so the whole board loads from this one row.
+    packed_pieces = models.BinaryField(default=bytes)
+    # Bumped with every change to packed_pieces. The per-process board
+    # caches are keyed on it, so a change made by another worker is a miss.
+    version = models.IntegerField(default=0)
+
+    def get_random_location(self) -> tuple[int, int]:
+        return random.randrange(self.cols), random.randrange(self.rows)
+
+    def get_occupied_spaces(self) -> set[tuple[int, int]]:
+        return packed_board.occupied_spaces(self.load_packed_pieces())
+
+    def load_packed_pieces(self):
+        return (
+            GameBoard.objects.filter(pk=self.pk)
+            .values_list("packed_pieces", flat=True)
+            .get()
+        )
+
+    def update_packed_pieces(self, change, *args) -> int:
+        # Applies change(data, *args) under the board's row lock, inside the
+        # caller's transaction, so concurrent changes can't overwrite each
+        # other and the column commits or rolls back with the rows. Returns
+        # the version the change was made on.
+        with transaction.atomic():
+            version, data = (
+                GameBoard.objects.select_for_update()
+                .filter(pk=self.pk)
+                .values_list("version", "packed_pieces")
+                .get()
+            )
+            GameBoard.objects.filter(pk=self.pk).update(
+                packed_pieces=change(data, *args),
+                version=version + 1,
+            )
+        self.version = version + 1
+        return version
+
+    def repack(self):
+        # For code that writes GamePiece rows in bulk, bypassing the models.
+        GameBoard.objects.filter(pk=self.pk).update(
+            packed_pieces=packed_board.pack(
+                self.gamepiece_set.order_by("id").values_list(*packed_board.FIELDS)
+            ),
+            version=F("version") + 1,
+        )
+        self.refresh_from_db(fields=["version"])
+
+    def piece_at(self, col: int, row: int):
+        return self.gamepiece_set.filter(col=col, row=row).first()
+
+    def is_unoccupied(self, col: int, row: int) -> bool:
+        return not self.gamepiece_set.filter(col=col, row=row).exists()
+
+    def pieces_in_rect(self, col: int, row: int, cols: int, rows: int):
+        return self.gamepiece_set.filter(
+            col__gte=col,
+            col__lt=col + cols,
+            row__gte=row,
+            row__lt=row + rows,
+        )
+
+    def spaces_changed(self, spaces: list[tuple[int, int]], old_version: int):
+        # The change took the board from old_version to old_version + 1. The
+        # caches only follow once it commits, so a rollback can't leave them
+        # ahead of the database.
+        def update_caches():
+            reachability_cache.invalidate(self.id, spaces, old_version, old_version + 1)
+            path_cache.end_turn(self.id)
+
+        transaction.on_commit(update_caches)
 
     def get_random_unoccupied_location(self) -> tuple[int, int]:
+        occupied_spaces = self.get_occupied_spaces()
+
+        # On large, sparse boards a few random probes almost always land on a
+        # free cell, which avoids materialising every cell of the board.
+        if len(occupied_spaces) * 2 < self.rows * self.cols:
+            for _i in range(RANDOM_LOCATION_PROBES):
+                space = self.get_random_location()
+                if space not in occupied_spaces:
+                    return space
+
         all_spaces = set()
         for row in range(self.rows):
             for col in range(self.cols):
                 all_spaces.add((col, row))
 
-        occupied_spaces = set()
-        for piece in self.gamepiece_set.all():
-            occupied_spaces.add((piece.col, piece.row))
-
         unoccupied_spaces = all_spaces - occupied_spaces
         return random.choice(list(unoccupied_spaces))
 
@@ -80,46 +292,122 @@ class GamePiece(models.Model):
     row = models.IntegerField()
     name = models.CharField(max_length=255)
     board = models.ForeignKey(GameBoard, on_delete=models.CASCADE)
-    class_name = models.CharField(max_length=255, default="brigand")
+    class_name = models.CharField(max_length=255, default=DEFAULT_UNIT_CLASS)
     movement = models.IntegerField(default=4)
 
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["board", "col", "row"],
+                name="unique_game_piece_position",
+            ),
+        ]
+
     @classmethod
     def create_at_random_location(cls, owner: Player, name: str):
         board: GameBoard = owner.game.board
-        col, row = board.get_random_unoccupied_location()
-        return cls.create_at_location(owner, name, col, row)
+
+        # Let the unique position constraint arbitrate placement instead of
+        # reading the board first; a collision just means trying another cell.
+        for _i in range(RANDOM_LOCATION_PROBES):
+            col, row = board.get_random_location()
+            piece = cls.try_create_at_location(owner, name, col, row)
+            if piece:
+                return piece
+
+        while True:
+            col, row = board.get_random_unoccupied_location()
+            piece = cls.try_create_at_location(owner, name, col, row)
+            if piece:
+                return piece
+
+    @classmethod
+    def try_create_at_location(cls, owner: Player, name: str, col: int, row: int):
+        try:
+            with transaction.atomic():
+                return cls.create_at_location(owner, name, col, row)
+        except IntegrityError:
+            return None
 
     @classmethod
     def create_at_location(cls, owner: Player, name: str, col: int, row: int):
-        return cls.objects.create(
+        unit_class = get_unit_class(DEFAULT_UNIT_CLASS)
+        piece = cls.objects.create(
             owner=owner,
             col=col,
             row=row,
             name=name,
             board=owner.game.board,
+            class_name=unit_class.name,
+            movement=unit_class.movement,
         )
+        owner.game.record_event(
+            game_events.PLACE,
+            piece=piece.id,
+            owner=owner.id,
+            name=piece.name,
+            col=piece.col,
+            row=piece.row,
+            class_name=piece.class_name,
+            movement=piece.movement,
+        )
+        old_version = piece.board.update_packed_pieces(
+            packed_board.add_piece,
+            tuple(getattr(piece, field) for field in packed_board.FIELDS),
+        )
+        piece.board.spaces_changed([(col, row)], old_version)
+        return piece
+
+    def move_to(self, col: int, row: int) -> bool:
+        try:
+            with transaction.atomic():
+                # Only move from the position we validated against, so two
+                # concurrent moves of the same piece can't both succeed.
+                moved = GamePiece.objects.filter(
+                    pk=self.pk,
+                    col=self.col,
+                    row=self.row,
+                ).update(col=col, row=row)
+                if not moved:
+                    return False
+                self.owner.game.record_event(
+                    game_events.MOVE,
+                    piece=self.id,
+                    col=col,
+                    row=row,
+                )
+                old_version = self.board.update_packed_pieces(
+                    packed_board.move_piece, self.id, col, row
+                )
+        except IntegrityError:
+            return False
+
+        self.board.spaces_changed([(self.col, self.row), (col, row)], old_version)
+        self.col = col
+        self.row = row
+        return True
+
+    @property
+    def unit_class(self) -> UnitClass:
+        return get_unit_class(self.class_name)
 
     def get_moveable_spaces(self) -> list[Tuple[int, int]]:
-        board = self.board
-        spaces = set()
-        spaces.add((self.col, self.row))
-        for _i in range(self.movement + 1):
-            for space in spaces.copy():
-                spaces.update(self._get_adjacent_spaces(space))
-        spaces = set(filter(lambda space: space[0] >= 0, spaces))
-        spaces = set(filter(lambda space: space[1] >= 0, spaces))
-        spaces = set(filter(lambda space: space[0] < board.cols, spaces))
-        spaces = set(filter(lambda space: space[1] < board.rows, spaces))
-        return list(spaces)
-
-    def _get_adjacent_spaces(self, space: Tuple[int, int]) -> list[Tuple[int, int]]:
-        col, row = space
-        return [
-            (col + 1, row),
-            (col - 1, row),
-            (col, row + 1),
-            (col, row - 1),
-        ]
+        return get_moveable_spaces(
+            self.col, self.row, self.movement, self.board.cols, self.board.rows
+        )
+
+    def get_attack_spaces(self) -> list[Tuple[int, int]]:
+        return self.unit_class.get_attack_spaces(
+            self.col, self.row, self.board.cols, self.board.rows
+        )
+
+
+def get_moveable_spaces(
+    col: int, row: int, movement: int, cols: int, rows: int
+) -> list[Tuple[int, int]]:
+    # Works on plain values so projections can use it without a GamePiece.
+    # movement is the piece's own, which starts out as its class's.
+    return translate(get_range_mask(movement), col, row, cols, rows)
 
 
 class Game(models.Model):
@@ -136,12 +424,14 @@ class Game(models.Model):
     # turn = models.IntegerField()
     # phase = models.IntegerField()
     board = models.ForeignKey(GameBoard, on_delete=models.CASCADE)
+    roster_version = models.IntegerField(default=0)
+    turn_order = models.IntegerField(default=0)
 
     @classmethod
     def create(cls, room: Room):
         board: GameBoard = GameBoard.objects.create(
-            rows=10,
-            cols=10,
+            rows=room.board_rows,
+            cols=room.board_cols,
         )
         new_game = cls(
             room=room,
@@ -150,13 +440,15 @@ class Game(models.Model):
         )
         new_game.save()
 
-        for user in room.occupants.all().order_by("id"):
+        for order, user in enumerate(room.occupants.all().order_by("id")):
             player = Player.objects.create(
                 user=user,
                 name=user.username,
                 game=new_game,
+                order=order,
             )
             player.save()
+            new_game.record_player_joined(player)
             GamePiece.create_at_random_location(
                 owner=player,
                 name=player.name,
@@ -168,9 +460,180 @@ class Game(models.Model):
             order=REQUIRED_PLAYER_COUNT,
         )
         enemy_player.save()
+        new_game.record_player_joined(enemy_player)
         GamePiece.create_at_random_location(
             owner=enemy_player,
             name=enemy_player.name,
         )
 
         return new_game
+
+    def get_free_orders(self, count: int) -> list[int]:
+        taken_orders = set(self.player_set.values_list("order", flat=True))
+        free_orders = []
+        order = 0
+        while len(free_orders) < count:
+            if order not in taken_orders:
+                free_orders.append(order)
+            order += 1
+        return free_orders
+
+    def get_turn_order(self) -> TurnOrder:
+        turn_order = turn_orders.get(self.id, self.roster_version)
+        if turn_order is None:
+            turn_order = turn_orders.build(
+                self.id,
+                self.roster_version,
+                [
+                    (
+                        player.id,
+                        player.name,
+                        player.order,
+                        player.is_automated(),
+                        player.is_connected(),
+                    )
+                    for player in self.player_set.all()
+                ],
+            )
+        turn_order.set_current_order(self.turn_order)
+        return turn_order
+
+    def bump_roster_version(self):
+        old_version = self.roster_version
+        Game.objects.filter(pk=self.pk).update(roster_version=F("roster_version") + 1)
+        self.refresh_from_db(fields=["roster_version"])
+        return turn_orders.roster_changed(self.id, old_version, self.roster_version)
+
+    def set_turn_order(self, order: int):
+        self.turn_order = order
+        Game.objects.filter(pk=self.pk).update(turn_order=order)
+
+    def advance_turn(self) -> TurnOrderNode:
+        current = self.get_turn_order().advance()
+        if current is not None:
+            self.set_turn_order(current.order)
+        return current
+
+    def player_connection_changed(self, player: Player, connected: bool):
+        # Returns the new current player if this passed the turn on, for the
+        # caller to hand to the turn service. Connectivity lives in the ring
+        # too, so it bumps roster_version and other workers rebuild theirs
+        # from Client.connected.
+        self.bump_roster_version()
+        turn_order = self.get_turn_order()
+        turn_order.set_connected(player.id, connected)
+        current = turn_order.current_player()
+        if not connected and current is not None and current.player_id == player.id:
+            return self.advance_turn()
+        return None
+
+    def get_plan_snapshot(self) -> dict:
+        enemy = self.player_set.filter(user__isnull=True).first()
+        return {
+            "cols": self.board.cols,
+            "rows": self.board.rows,
+            "enemy_player_id": enemy.id if enemy else None,
+            "pieces": list(packed_board.iter_pieces(self.board.load_packed_pieces())),
+        }
+
+    def set_state(self, state: str):
+        self.state = state
+        self.save()
+        self.record_event(game_events.STATE, state=state)
+
+    def record_player_joined(self, player: Player):
+        return self.record_event(
+            game_events.JOIN,
+            player=player.id,
+            name=player.name,
+            order=player.order,
+        )
+
+    def record_event(self, kind: str, **payload):
+        with transaction.atomic():
+            # Lock the game row so concurrent writers can't claim the same seq.
+            Game.objects.select_for_update().filter(pk=self.pk).exists()
+            last_seq = self.gameevent_set.aggregate(last_seq=Max("seq"))["last_seq"]
+            event = GameEvent.objects.create(
+                game=self,
+                seq=(last_seq or 0) + 1,
+                kind=kind,
+                payload=payload,
+            )
+            if event.seq % game_events.SNAPSHOT_INTERVAL == 0:
+                self.take_snapshot()
+        return event
+
+    def take_snapshot(self):
+        seq, game_state = self.rebuild_state_with_seq()
+        return GameSnapshot.objects.update_or_create(
+            game=self,
+            seq=seq,
+            defaults={"state": game_state},
+        )[0]
+
+    def rebuild_state(self, up_to_seq: int = None) -> dict:
+        return self.rebuild_state_with_seq(up_to_seq)[1]
+
+    def rebuild_state_with_seq(self, up_to_seq: int = None) -> Tuple[int, dict]:
+        snapshots = self.gamesnapshot_set.order_by("-seq")
+        events = self.gameevent_set.order_by("seq")
+        if up_to_seq is not None:
+            snapshots = snapshots.filter(seq__lte=up_to_seq)
+            events = events.filter(seq__lte=up_to_seq)
+
+        snapshot = snapshots.first()
+        if snapshot:
+            seq, game_state = snapshot.seq, snapshot.state
+        else:
+            seq, game_state = 0, game_events.empty_game_state()
+
+        for seq, kind, payload in events.filter(seq__gt=seq).values_list(
+            "seq", "kind", "payload"
+        ):
+            game_events.apply_game_event(game_state, kind, payload)
+        return seq, game_state
+
+
+class GameEvent(models.Model):
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    seq = models.IntegerField()
+    kind = models.CharField(
+        max_length=255,
+        choices=[(kind, kind) for kind in game_events.EVENT_KINDS],
+    )
+    payload = models.JSONField(default=dict)
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["game", "seq"],
+                name="unique_game_event_seq",
+            ),
+        ]
+
+
+class GameSnapshot(models.Model):
+    game = models.ForeignKey(Game, on_delete=models.CASCADE)
+    seq = models.IntegerField()
+    state = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["game", "seq"],
+                name="unique_game_snapshot_seq",
+            ),
+        ]
+
+
+class ArchivedGame(models.Model):
+    # A finished game squashed into one zlib-compressed JSON record by
+    # chat.archive, which also reads it back.
+    game_id = models.IntegerField(unique=True)
+    room_name = models.CharField(max_length=255)
+    event_count = models.IntegerField()
+    data = models.BinaryField()
+    archived_at = models.DateTimeField(auto_now_add=True)
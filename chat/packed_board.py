@@ -0,0 +1,75 @@
+import sys
+from array import array
+
+# Every piece is one fixed-width record of int32s, in GamePiece field order.
+FIELDS = ("id", "owner_id", "col", "row", "movement")
+WIDTH = len(FIELDS)
+ID, OWNER_ID, COL, ROW, MOVEMENT = range(WIDTH)
+TYPECODE = "i"
+# Stored little-endian so a column written on one machine reads on any other.
+SWAP_BYTES = sys.byteorder == "big"
+
+assert array(TYPECODE).itemsize == 4
+
+
+def pack(pieces) -> bytes:
+    records = array(TYPECODE)
+    for piece in pieces:
+        records.extend(piece)
+    return to_bytes(records)
+
+
+def to_bytes(records: array) -> bytes:
+    if SWAP_BYTES:
+        records.byteswap()
+    return records.tobytes()
+
+
+def to_array(data) -> array:
+    records = array(TYPECODE)
+    records.frombytes(data)
+    if SWAP_BYTES:
+        records.byteswap()
+    return records
+
+
+def view(data) -> memoryview:
+    # The flat int32s of data without copying them; record i is
+    # [i * WIDTH : (i + 1) * WIDTH], and [COL::WIDTH] is every piece's col.
+    if SWAP_BYTES:
+        return memoryview(to_array(data))
+    return memoryview(data).cast(TYPECODE)
+
+
+def iter_pieces(data):
+    records = view(data)
+    for start in range(0, len(records), WIDTH):
+        yield tuple(records[start : start + WIDTH])
+
+
+def occupied_spaces(data) -> set[tuple[int, int]]:
+    records = view(data)
+    return set(zip(records[COL::WIDTH], records[ROW::WIDTH]))
+
+
+def add_piece(data, piece: tuple) -> bytes:
+    records = to_array(data)
+    records.extend(piece)
+    return to_bytes(records)
+
+
+def move_piece(data, piece_id: int, col: int, row: int) -> bytes:
+    records = to_array(data)
+    start = records[ID::WIDTH].index(piece_id) * WIDTH
+    records[start + COL] = col
+    records[start + ROW] = row
+    return to_bytes(records)
+
+
+def remove_owner(data, owner_id: int) -> bytes:
+    records = to_array(data)
+    kept = array(TYPECODE)
+    for start in range(0, len(records), WIDTH):
+        if records[start + OWNER_ID] != owner_id:
+            kept.extend(records[start : start + WIDTH])
+    return to_bytes(kept)
@@ -0,0 +1,171 @@
+import heapq
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+from django.conf import settings
+
+Space = Tuple[int, int]
+
+
+class Grid:
+    def __init__(self, cols: int, rows: int, blocked: Iterable[Space] = ()):
+        self.cols = cols
+        self.rows = rows
+        self.blocked = frozenset(blocked)
+
+    @classmethod
+    def from_board(cls, board):
+        return cls(board.cols, board.rows, board.get_occupied_spaces())
+
+    def passable(self, space: Space) -> bool:
+        col, row = space
+        return (
+            0 <= col < self.cols and 0 <= row < self.rows and space not in self.blocked
+        )
+
+    def neighbors(self, space: Space) -> list[Space]:
+        col, row = space
+        return [
+            neighbor
+            for neighbor in (
+                (col + 1, row),
+                (col - 1, row),
+                (col, row + 1),
+                (col, row - 1),
+            )
+            if self.passable(neighbor)
+        ]
+
+    def cost(self, space: Space) -> int:
+        # Every passable cell costs one step until the board has terrain.
+        return 1
+
+
+def manhattan(a: Space, b: Space) -> int:
+    return abs(a[0] - b[0]) + abs(a[1] - b[1])
+
+
+def reconstruct_path(parents: dict, goal: Space) -> list[Space]:
+    path = [goal]
+    while parents[path[-1]] is not None:
+        path.append(parents[path[-1]])
+    path.reverse()
+    return path
+
+
+def astar(grid: Grid, start: Space, goal: Space) -> Optional[list[Space]]:
+    if start != goal and not grid.passable(goal):
+        return None
+
+    # Ties on the estimate are broken towards the deeper node, which keeps
+    # A* from fanning out across the many equal-cost paths of an open grid.
+    parents = {start: None}
+    costs = {start: 0}
+    frontier = [(manhattan(start, goal), 0, start)]
+    while frontier:
+        _estimate, negative_cost, space = heapq.heappop(frontier)
+        if space == goal:
+            return reconstruct_path(parents, goal)
+        cost = -negative_cost
+        if cost > costs[space]:
+            continue
+        for neighbor in grid.neighbors(space):
+            neighbor_cost = cost + grid.cost(neighbor)
+            if neighbor_cost < costs.get(neighbor, neighbor_cost + 1):
+                costs[neighbor] = neighbor_cost
+                parents[neighbor] = space
+                heapq.heappush(
+                    frontier,
+                    (
+                        neighbor_cost + manhattan(neighbor, goal),
+                        -neighbor_cost,
+                        neighbor,
+                    ),
+                )
+    return None
+
+
+def dijkstra(
+    grid: Grid,
+    start: Space,
+    targets: Iterable[Space] = None,
+    max_cost: int = None,
+) -> Tuple[dict, dict]:
+    # Settles cells in cost order and stops early once every target has
+    # been reached, so one search answers paths to many targets.
+    remaining = set(targets) if targets is not None else None
+    parents = {start: None}
+    costs = {start: 0}
+    settled = set()
+    frontier = [(0, start)]
+    while frontier:
+        cost, space = heapq.heappop(frontier)
+        if space in settled:
+            continue
+        settled.add(space)
+        if remaining is not None:
+            remaining.discard(space)
+            if not remaining:
+                break
+        for neighbor in grid.neighbors(space):
+            neighbor_cost = cost + grid.cost(neighbor)
+            if max_cost is not None and neighbor_cost > max_cost:
+                continue
+            if neighbor_cost < costs.get(neighbor, neighbor_cost + 1):
+                costs[neighbor] = neighbor_cost
+                parents[neighbor] = space
+                heapq.heappush(frontier, (neighbor_cost, neighbor))
+    return costs, parents
+
+
+def reachable_spaces(grid: Grid, start: Space, max_cost: int) -> set[Space]:
+    costs, _parents = dijkstra(grid, start, max_cost=max_cost)
+    return set(costs) - {start}
+
+
+class PathCache:
+    # Paths are only valid while the board's occupancy is unchanged, so the
+    # cache holds one board version's grid and paths per board. A change
+    # made here ends the turn; one made by another worker bumps the version
+    # the caller's board was read at, which misses. Only the
+    # BOARD_CACHE_SIZE most recently used boards are kept.
+    def __init__(self):
+        self.boards: OrderedDict[int, Tuple[int, Grid, dict]] = OrderedDict()
+
+    def get_grid(self, board) -> Grid:
+        return self._get_turn(board)[0]
+
+    def get_path(self, board, start: Space, goal: Space) -> Optional[list[Space]]:
+        grid, paths = self._get_turn(board)
+        if (start, goal) not in paths:
+            paths[(start, goal)] = astar(grid, start, goal)
+        return paths[(start, goal)]
+
+    def prime(self, board_id: int, version: int, grid: Grid):
+        turn = self.boards.get(board_id)
+        if turn is None or turn[0] < version:
+            self._remember(board_id, (version, grid, {}))
+
+    def end_turn(self, board_id: int):
+        self.boards.pop(board_id, None)
+
+    def _get_turn(self, board) -> Tuple[Grid, dict]:
+        turn = self.boards.get(board.id)
+        if turn is not None and turn[0] == board.version:
+            self.boards.move_to_end(board.id)
+            return turn[1:]
+        # A caller holding an older copy of the board must not replace the
+        # turn of a newer one.
+        stale = turn is not None and turn[0] > board.version
+        turn = (board.version, Grid.from_board(board), {})
+        if not stale:
+            self._remember(board.id, turn)
+        return turn[1:]
+
+    def _remember(self, board_id: int, turn: tuple):
+        self.boards[board_id] = turn
+        self.boards.move_to_end(board_id)
+        while len(self.boards) > settings.BOARD_CACHE_SIZE:
+            self.boards.popitem(last=False)
+
+
+path_cache = PathCache()
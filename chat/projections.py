@@ -0,0 +1,104 @@
+from typing import Optional
+from chat.models import (
+    Game,
+    GamePiece,
+    Player,
+    REQUIRED_PLAYER_COUNT,
+    get_moveable_spaces,
+)
+from chat.turn_order import TurnOrder, turn_orders
+from chat.viewport import Viewport
+
+
+# Builds the same game_info payload as RoomInfoMixin.get_game_info_message
+# from values_list rows instead of a prefetched Room, so no model instances
+# are created on the way. check_game_info_projection compares the two.
+
+
+def get_turn_order(game_id: int, roster_version: int, turn_order: int) -> TurnOrder:
+    ring = turn_orders.get(game_id, roster_version)
+    if ring is None:
+        players = []
+        for player_id, name, order, user_id, connected in Player.objects.filter(
+            game_id=game_id
+        ).values_list("id", "name", "order", "user_id", "user__client__connected"):
+            automated = user_id is None
+            players.append(
+                (player_id, name, order, automated, automated or bool(connected))
+            )
+        ring = turn_orders.build(game_id, roster_version, players)
+    ring.set_current_order(turn_order)
+    return ring
+
+
+def load_game_info_message(room_name: str, viewport: Viewport = None) -> Optional[dict]:
+    game = (
+        Game.objects.filter(room__name=room_name)
+        .values_list(
+            "id",
+            "state",
+            "roster_version",
+            "turn_order",
+            "board_id",
+            "board__cols",
+            "board__rows",
+        )
+        .first()
+    )
+    if game is None:
+        return None
+    game_id, state, roster_version, turn_order, board_id, cols, rows = game
+
+    pieces = GamePiece.objects.filter(board_id=board_id)
+    if viewport is not None:
+        pieces = pieces.filter(
+            col__gte=viewport.col,
+            col__lt=viewport.col + viewport.cols,
+            row__gte=viewport.row,
+            row__lt=viewport.row + viewport.rows,
+        )
+    pieces = pieces.values_list(
+        "id", "name", "class_name", "col", "row", "movement", "owner__name"
+    )
+
+    ring = get_turn_order(game_id, roster_version, turn_order)
+    current = ring.current_player()
+    message = {
+        "type": "game_info",
+        "game": {
+            "state": state,
+            "players": [{"name": player.name} for player in ring.players()],
+            "currentPlayer": (
+                current.name if state == "playing" and current is not None else None
+            ),
+            "requiredPlayers": REQUIRED_PLAYER_COUNT,
+            "grid": {
+                "cols": cols,
+                "rows": rows,
+            },
+            "boardPieces": [
+                get_piece_info(piece, cols, rows, viewport) for piece in pieces
+            ],
+        },
+    }
+    if viewport is not None:
+        message["game"]["viewport"] = viewport.to_message()
+    return message
+
+
+def get_piece_info(piece: tuple, cols: int, rows: int, viewport: Viewport = None):
+    piece_id, name, class_name, col, row, movement, owner_name = piece
+    moveable_spaces = get_moveable_spaces(col, row, movement, cols, rows)
+    return {
+        "id": piece_id,
+        "name": name,
+        "className": class_name,
+        "row": row,
+        "col": col,
+        "player": {
+            "name": owner_name,
+        },
+        "moveableSpaces": (
+            moveable_spaces if viewport is None else viewport.clip(moveable_spaces)
+        ),
+    }
@@ -0,0 +1,82 @@
+from collections import OrderedDict
+from typing import Iterable, Optional, Tuple
+from django.conf import settings
+from chat.pathfinding import path_cache, reachable_spaces
+
+
+class ReachabilityCache:
+    # Maps board id -> (board version, piece id -> ((col, row, movement),
+    # reachable spaces)). A change made by another worker bumps the board's
+    # version, so every entry of that board misses until it is recomputed.
+    # Only the BOARD_CACHE_SIZE most recently used boards are kept.
+    def __init__(self):
+        self.boards: OrderedDict[int, Tuple[int, dict]] = OrderedDict()
+
+    def get(self, piece) -> Optional[frozenset]:
+        pieces = self._get_pieces(piece.board_id, piece.board.version)
+        entry = pieces.get(piece.id) if pieces is not None else None
+        if entry is None or entry[0] != self._key(piece):
+            return None
+        return entry[1]
+
+    def compute(self, piece) -> frozenset:
+        reachable = frozenset(
+            reachable_spaces(
+                path_cache.get_grid(piece.board),
+                (piece.col, piece.row),
+                piece.movement,
+            )
+        )
+        pieces = self._get_pieces(piece.board_id, piece.board.version)
+        if pieces is None:
+            entry = self.boards.get(piece.board_id)
+            if entry is not None and entry[0] > piece.board.version:
+                # Computed from an older copy of the board than the cache has.
+                return reachable
+            pieces = self._remember(piece.board_id, piece.board.version, {})
+        pieces[piece.id] = (self._key(piece), reachable)
+        return reachable
+
+    def invalidate(
+        self,
+        board_id: int,
+        spaces: Iterable[Tuple[int, int]],
+        old_version: int,
+        new_version: int,
+    ):
+        # Brings the board's entries from old_version to new_version when
+        # they were current before the change. Only pieces whose movement
+        # range covers one of the changed spaces can have a different
+        # reachable set afterwards.
+        pieces = self._get_pieces(board_id, old_version)
+        if pieces is None:
+            self.boards.pop(board_id, None)
+            return
+        spaces = list(spaces)
+        for piece_id, ((col, row, movement), _reachable) in list(pieces.items()):
+            if any(
+                abs(col - space_col) + abs(row - space_row) <= movement
+                for space_col, space_row in spaces
+            ):
+                del pieces[piece_id]
+        self.boards[board_id] = (new_version, pieces)
+
+    def _get_pieces(self, board_id: int, version: int) -> Optional[dict]:
+        entry = self.boards.get(board_id)
+        if entry is None or entry[0] != version:
+            return None
+        self.boards.move_to_end(board_id)
+        return entry[1]
+
+    def _remember(self, board_id: int, version: int, pieces: dict) -> dict:
+        self.boards[board_id] = (version, pieces)
+        self.boards.move_to_end(board_id)
+        while len(self.boards) > settings.BOARD_CACHE_SIZE:
+            self.boards.popitem(last=False)
+        return pieces
+
+    def _key(self, piece) -> Tuple[int, int, int]:
+        return piece.col, piece.row, piece.movement
+
+
+reachability_cache = ReachabilityCache()
@@ -1,6 +1,9 @@
+import uuid
 from django_rq import job
-from chat.models import Client
+from chat.archive import archive_games, get_finished_game_ids
+from chat.models import Client, Room, Game, GameBoard
 from datetime import timedelta
+from django.conf import settings
 from django.utils import timezone
 
 
@@ -27,4 +30,46 @@ def delete_disconnected_users():
     ).prefetch_related("user")
 
     for client in auth_clients:
+        # Leave the room first so its occupant count, turn order and packed
+        # board don't keep the user's seat and pieces after the cascade.
+        room = (
+            Room.objects.filter(occupants=client.user)
+            .select_related("game__board")
+            .first()
+        )
+        if room:
+            room.remove_occupant(client.user)
         client.user.delete()
+
+
+@job
+def maintain_room_pool():
+    recycle_stale_pooled_rooms()
+    provision_pooled_rooms()
+
+
+def recycle_stale_pooled_rooms():
+    cutoff = timezone.now() - timedelta(minutes=settings.ROOM_POOL_MAX_AGE_MINUTES)
+    stale_room_ids = list(
+        Room.objects.filter(pooled_at__lte=cutoff).values_list("id", flat=True)
+    )
+    board_ids = list(
+        Game.objects.filter(room_id__in=stale_room_ids).values_list(
+            "board_id", flat=True
+        )
+    )
+    # Re-check pooled_at so a room claimed since the select above survives.
+    Room.objects.filter(id__in=stale_room_ids, pooled_at__lte=cutoff).delete()
+    GameBoard.objects.filter(id__in=board_ids, game__isnull=True).delete()
+
+
+def provision_pooled_rooms():
+    pooled_count = Room.objects.filter(pooled_at__isnull=False).count()
+    for _i in range(settings.ROOM_POOL_SIZE - pooled_count):
+        Room.create_pooled(name=f"pool-{uuid.uuid4().hex[:12]}")
+
+
+@job
+def archive_finished_games():
+    while archive_games(get_finished_game_ids(settings.ARCHIVE_BATCH_SIZE)):
+        pass
@@ -0,0 +1,65 @@
+import asyncio
+from typing import Awaitable, Callable
+from channels.db import database_sync_to_async
+from django.conf import settings
+from chat.encoding import encode_game_info
+from chat.models import Client
+
+
+def get_spectator_group(room_name: str) -> str:
+    return f"{room_name}.spectators"
+
+
+@database_sync_to_async
+def has_spectators(room_name: str) -> bool:
+    return Client.objects.filter(spectating=room_name, connected=True).exists()
+
+
+class SpectatorFanout:
+    # Spectators get at most one frame per SPECTATOR_FRAME_INTERVAL per room.
+    # Changes in between only replace the pending loader, so a busy room
+    # builds and encodes its spectator state once per interval no matter how
+    # many moves or spectators it has, and never on the players' send path.
+    # Rooms without spectators skip the load and send altogether.
+    #
+    # Each worker process has its own fan-out and flushes the changes it
+    # handled, so a room whose moves land on several workers can send
+    # spectators up to one frame per interval per worker.
+    def __init__(self):
+        self.pending: dict[str, Callable[[], Awaitable[dict]]] = {}
+        self.tasks: dict[str, asyncio.Task] = {}
+
+    def mark_dirty(
+        self,
+        channel_layer,
+        room_name: str,
+        load_message: Callable[[], Awaitable[dict]],
+    ):
+        self.pending[room_name] = load_message
+        if room_name not in self.tasks:
+            self.tasks[room_name] = asyncio.create_task(
+                self.flush(channel_layer, room_name)
+            )
+
+    async def flush(self, channel_layer, room_name: str):
+        try:
+            while room_name in self.pending:
+                load_message = self.pending.pop(room_name)
+                if not await has_spectators(room_name):
+                    message = None
+                else:
+                    message = await load_message()
+                if message is not None:
+                    await channel_layer.group_send(
+                        get_spectator_group(room_name),
+                        {
+                            "type": "forward_frame",
+                            "frame": encode_game_info(message),
+                        },
+                    )
+                await asyncio.sleep(settings.SPECTATOR_FRAME_INTERVAL)
+        finally:
+            self.tasks.pop(room_name, None)
+
+
+spectator_fanout = SpectatorFanout()
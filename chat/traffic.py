@@ -0,0 +1,82 @@
+import atexit
+import queue
+import threading
+import time
+from typing import Iterator, Optional
+from django.conf import settings
+from chat import encoding
+
+# One JSON array per line: [unix time, connection, direction, frame].
+CONNECTED = "c"
+INBOUND = "i"
+OUTBOUND = "o"
+DISCONNECTED = "d"
+
+
+class TrafficRecorder:
+    # Appends every websocket frame to TRAFFIC_RECORDING_PATH when it is set,
+    # so a production session can be replayed locally with replay_ws_traffic.
+    # Frames are queued in memory for a writer thread, so the event loop never
+    # waits on the disk. It flushes once flush_bytes have built up or
+    # flush_interval seconds have passed, so a crash loses at most that much.
+    def __init__(self, path: Optional[str], flush_bytes: int, flush_interval: float):
+        self.path = path
+        self.flush_bytes = flush_bytes
+        self.flush_interval = flush_interval
+        self.lines: queue.SimpleQueue = queue.SimpleQueue()
+        self.writer: Optional[threading.Thread] = None
+
+    @property
+    def enabled(self) -> bool:
+        return self.path is not None
+
+    def record(self, connection: str, direction: str, frame: str = None):
+        if self.writer is None:
+            self.writer = threading.Thread(
+                target=self.write_lines, name="traffic-recorder", daemon=True
+            )
+            self.writer.start()
+            atexit.register(self.close)
+        self.lines.put(
+            encoding.dumps([time.time(), connection, direction, frame]) + "\n"
+        )
+
+    def write_lines(self):
+        with open(self.path, "a", encoding="utf-8") as file:
+            unflushed = 0
+            flush_at = time.monotonic() + self.flush_interval
+            while True:
+                try:
+                    line = self.lines.get(timeout=max(0.0, flush_at - time.monotonic()))
+                except queue.Empty:
+                    line = ""
+                if line is None:
+                    return
+                file.write(line)
+                unflushed += len(line)
+                if unflushed >= self.flush_bytes or time.monotonic() >= flush_at:
+                    if unflushed:
+                        file.flush()
+                    unflushed = 0
+                    flush_at = time.monotonic() + self.flush_interval
+
+    def close(self):
+        if self.writer is not None:
+            self.lines.put(None)
+            self.writer.join()
+            self.writer = None
+
+
+def read_traffic(path: str) -> Iterator[tuple[float, str, str, Optional[str]]]:
+    with open(path, encoding="utf-8") as file:
+        for line in file:
+            if line.strip():
+                timestamp, connection, direction, frame = encoding.loads(line)
+                yield timestamp, connection, direction, frame
+
+
+traffic_recorder = TrafficRecorder(
+    settings.TRAFFIC_RECORDING_PATH,
+    settings.TRAFFIC_FLUSH_BYTES,
+    settings.TRAFFIC_FLUSH_INTERVAL,
+)
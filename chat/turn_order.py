@@ -0,0 +1,153 @@
+from typing import Iterable, Optional, Tuple
+
+
+class TurnOrderNode:
+    __slots__ = ("player_id", "name", "order", "automated", "connected", "prev", "next")
+
+    def __init__(self, player_id: int, name: str, order: int, automated: bool):
+        self.player_id = player_id
+        self.name = name
+        self.order = order
+        self.automated = automated
+        self.connected = True
+        self.prev = self
+        self.next = self
+
+    def can_act(self) -> bool:
+        return self.connected
+
+
+class TurnOrder:
+    # Circular doubly linked list of a game's players sorted by Player.order.
+    # version mirrors Game.roster_version so a ring built before another
+    # worker changed the roster or a player's connection can be detected and
+    # rebuilt.
+    def __init__(self, version: int = 0):
+        self.version = version
+        self.nodes: dict[int, TurnOrderNode] = {}
+        self.by_order: dict[int, TurnOrderNode] = {}
+        self.head: Optional[TurnOrderNode] = None
+        self.current: Optional[TurnOrderNode] = None
+
+    def __len__(self):
+        return len(self.nodes)
+
+    def add(self, player_id: int, name: str, order: int, automated: bool = False):
+        node = TurnOrderNode(player_id, name, order, automated)
+        self.nodes[player_id] = node
+        self.by_order[order] = node
+        if self.head is None:
+            self.head = self.current = node
+            return node
+
+        # Players almost always join with the highest order so far, in which
+        # case the walk stops straight away at the tail.
+        after = self.head.prev
+        while after.order > order and after is not self.head:
+            after = after.prev
+        if after.order > order:
+            self._link_after(self.head.prev, node)
+            self.head = node
+        else:
+            self._link_after(after, node)
+        return node
+
+    def remove(self, player_id: int):
+        node = self.nodes.pop(player_id, None)
+        if node is None:
+            return
+        self.by_order.pop(node.order, None)
+        if node.next is node:
+            self.head = self.current = None
+            return
+        if self.head is node:
+            self.head = node.next
+        if self.current is node:
+            self.current = node.next
+        node.prev.next = node.next
+        node.next.prev = node.prev
+
+    def set_connected(self, player_id: int, connected: bool):
+        node = self.nodes.get(player_id)
+        if node is not None:
+            node.connected = connected
+
+    def set_current_order(self, order: int):
+        node = self.by_order.get(order)
+        if node is not None:
+            self.current = node
+
+    def current_player(self) -> Optional[TurnOrderNode]:
+        return self.current
+
+    def next_player(self, skip_disconnected: bool = True) -> Optional[TurnOrderNode]:
+        if self.current is None:
+            return None
+        node = self.current.next
+        while skip_disconnected and not node.can_act() and node is not self.current:
+            node = node.next
+        return node
+
+    def advance(self, skip_disconnected: bool = True) -> Optional[TurnOrderNode]:
+        self.current = self.next_player(skip_disconnected)
+        return self.current
+
+    def players(self) -> Iterable[TurnOrderNode]:
+        node = self.head
+        for _i in range(len(self.nodes)):
+            yield node
+            node = node.next
+
+    def _link_after(self, after: TurnOrderNode, node: TurnOrderNode):
+        node.prev = after
+        node.next = after.next
+        after.next.prev = node
+        after.next = node
+
+
+class TurnOrderRegistry:
+    def __init__(self):
+        self.games: dict[int, TurnOrder] = {}
+
+    def get(self, game_id: int, version: int) -> Optional[TurnOrder]:
+        turn_order = self.games.get(game_id)
+        if turn_order is None or turn_order.version != version:
+            return None
+        return turn_order
+
+    def build(
+        self,
+        game_id: int,
+        version: int,
+        players: Iterable[Tuple[int, str, int, bool, bool]],
+    ) -> TurnOrder:
+        turn_order = TurnOrder(version)
+        for player_id, name, order, automated, connected in sorted(
+            players, key=lambda player: player[2]
+        ):
+            turn_order.add(player_id, name, order, automated)
+            turn_order.set_connected(player_id, connected)
+
+        # A caller holding an older copy of the game must not replace a ring
+        # that already reflects later roster changes.
+        existing = self.games.get(game_id)
+        if existing is None or existing.version < version:
+            self.games[game_id] = turn_order
+        return turn_order
+
+    def roster_changed(self, game_id: int, old_version: int, new_version: int):
+        # Returns the ring if it was current before the change so the caller
+        # can patch it in place; otherwise it is dropped and rebuilt lazily.
+        turn_order = self.games.get(game_id)
+        if (
+            turn_order is None
+            or turn_order.version != old_version
+            or new_version != old_version + 1
+        ):
+            self.games.pop(game_id, None)
+            return None
+        turn_order.version = new_version
+        return turn_order
+
+
+turn_orders = TurnOrderRegistry()
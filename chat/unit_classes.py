@@ -0,0 +1,80 @@
+import functools
+from dataclasses import dataclass
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+DEFAULT_UNIT_CLASS = "brigand"
+
+Mask = tuple[tuple[int, int], ...]
+
+
+@functools.lru_cache(maxsize=None)
+def get_range_mask(radius: int) -> Mask:
+    # Every (col, row) offset within radius steps of a piece at the origin,
+    # row by row.
+    return tuple(
+        (col_offset, row_offset)
+        for row_offset in range(-radius, radius + 1)
+        for col_offset in range(abs(row_offset) - radius, radius - abs(row_offset) + 1)
+    )
+
+
+@functools.lru_cache(maxsize=None)
+def get_row_spans(radius: int) -> tuple:
+    # The same offsets as (row offset, first col offset, bits), one run of
+    # bits per row, for or-ing into per-row bitsets.
+    return tuple(
+        (row_offset, abs(row_offset) - radius, (1 << 2 * reach + 1) - 1)
+        for row_offset in range(-radius, radius + 1)
+        for reach in [radius - abs(row_offset)]
+    )
+
+
+def translate(mask: Mask, col: int, row: int, cols: int, rows: int) -> list:
+    # The mask moved onto (col, row) and clipped to the board.
+    return [
+        (col + col_offset, row + row_offset)
+        for col_offset, row_offset in mask
+        if 0 <= col + col_offset < cols and 0 <= row + row_offset < rows
+    ]
+
+
+@dataclass(frozen=True)
+class UnitClass:
+    name: str
+    movement: int
+    attack_range: int
+    sight_range: int
+
+    @property
+    def attack_mask(self) -> Mask:
+        return get_range_mask(self.attack_range)
+
+    def get_attack_spaces(self, col: int, row: int, cols: int, rows: int) -> list:
+        return translate(self.attack_mask, col, row, cols, rows)
+
+
+def load_unit_classes(config: dict) -> dict[str, UnitClass]:
+    unit_classes = {}
+    for name, stats in config.items():
+        try:
+            unit_classes[name] = UnitClass(name, **stats)
+        except TypeError as error:
+            raise ImproperlyConfigured(f"UNIT_CLASSES[{name!r}]: {error}")
+    if DEFAULT_UNIT_CLASS not in unit_classes:
+        raise ImproperlyConfigured(f"UNIT_CLASSES has no {DEFAULT_UNIT_CLASS!r}")
+    # Build every class's masks now, so no query pays for the expansion.
+    for unit_class in unit_classes.values():
+        get_range_mask(unit_class.movement)
+        get_range_mask(unit_class.attack_range)
+        get_range_mask(unit_class.sight_range)
+        get_row_spans(unit_class.sight_range)
+    return unit_classes
+
+
+unit_classes = load_unit_classes(settings.UNIT_CLASSES)
+
+
+def get_unit_class(name: str) -> UnitClass:
+    # Pieces of a class since dropped from UNIT_CLASSES fight as the default.
+    return unit_classes.get(name) or unit_classes[DEFAULT_UNIT_CLASS]
@@ -1,4 +1,7 @@
 from django.urls import path
 from chat import views
 
-urlpatterns = [path("", views.index, name="index")]
+urlpatterns = [
+    path("", views.index, name="index"),
+    path("ready", views.ready, name="ready"),
+]
@@ -0,0 +1,74 @@
+from dataclasses import dataclass
+from typing import Iterable, Tuple
+
+
+@dataclass(frozen=True)
+class Viewport:
+    col: int
+    row: int
+    cols: int
+    rows: int
+
+    @classmethod
+    def from_message(cls, message_data: dict):
+        viewport = cls(
+            col=int(message_data["col"]),
+            row=int(message_data["row"]),
+            cols=int(message_data["cols"]),
+            rows=int(message_data["rows"]),
+        )
+        if viewport.cols <= 0 or viewport.rows <= 0:
+            raise ValueError("Viewport must have a positive size")
+        return viewport
+
+    def contains(self, col: int, row: int) -> bool:
+        return (
+            self.col <= col < self.col + self.cols
+            and self.row <= row < self.row + self.rows
+        )
+
+    def intersects(self, cells: Iterable[Tuple[int, int]]) -> bool:
+        return any(self.contains(col, row) for col, row in cells)
+
+    def clip(self, spaces: Iterable[Tuple[int, int]]) -> list[Tuple[int, int]]:
+        return [space for space in spaces if self.contains(*space)]
+
+    def clip_visible_rows(self, visible_rows: list[str], board_cols: int) -> list:
+        # The hex row bitsets of fog of war cut to the part of the viewport
+        # on the board: item i is row max(row, 0) + i, bit c is column
+        # max(col, 0) + c.
+        first_col = max(self.col, 0)
+        mask = (1 << max(min(self.col + self.cols, board_cols) - first_col, 0)) - 1
+        return [
+            format(int(bits, 16) >> first_col & mask, "x")
+            for bits in visible_rows[max(self.row, 0) : max(self.row + self.rows, 0)]
+        ]
+
+    def to_message(self) -> dict:
+        return {
+            "col": self.col,
+            "row": self.row,
+            "cols": self.cols,
+            "rows": self.rows,
+        }
+
+
+def filter_game_info_message(message: dict, viewport: Viewport) -> dict:
+    game = message["game"]
+    filtered = {
+        **game,
+        "viewport": viewport.to_message(),
+        "boardPieces": [
+            {
+                **piece,
+                "moveableSpaces": viewport.clip(piece["moveableSpaces"]),
+            }
+            for piece in game["boardPieces"]
+            if viewport.contains(piece["col"], piece["row"])
+        ],
+    }
+    if "visibleRows" in game:
+        filtered["visibleRows"] = viewport.clip_visible_rows(
+            game["visibleRows"], game["grid"]["cols"]
+        )
+    return {**message, "game": filtered}
@@ -1,6 +1,7 @@
 from django.shortcuts import render
 from django.conf import settings
-from django.http import HttpResponse
+from django.http import HttpResponse, JsonResponse
+from chat.hot_state import warm_start
 
 # Create your views here.
 
@@ -12,3 +13,10 @@ from django.http import HttpResponse
 
 def index(request):
     return render(request, template_name="chat/index.html")
+
+
+def ready(request):
+    return JsonResponse(
+        {"ready": warm_start.ready, **warm_start.stats},
+        status=200 if warm_start.ready else 503,
+    )
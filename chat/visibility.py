@@ -0,0 +1,183 @@
+from collections import OrderedDict
+from typing import Optional
+from django.conf import settings
+from chat import encoding
+from chat.unit_classes import get_row_spans, get_unit_class
+
+# (col, row, sight range) of each piece whose sight is combined.
+Sights = list[tuple[int, int, int]]
+
+
+def get_visible_rows(sights: Sights, cols: int, rows: int) -> list[int]:
+    # One bitset per board row, bit c set if column c of that row is in
+    # sight of any piece: each row of a piece's cached sight mask is
+    # shifted onto its column, clipped to the board and or-ed in at once.
+    board = (1 << cols) - 1
+    visible = [0] * rows
+    for col, row, sight in sights:
+        for row_offset, col_offset, bits in get_row_spans(sight):
+            if 0 <= row + row_offset < rows:
+                shift = col + col_offset
+                bits = bits << shift if shift >= 0 else bits >> -shift
+                visible[row + row_offset] |= bits & board
+    return visible
+
+
+def is_visible(visible: list[int], col: int, row: int) -> bool:
+    return bool(visible[row] >> col & 1)
+
+
+class RoomVisibility:
+    # What every player of one room can see, and their game_info views. A
+    # change only recomputes the sight of players whose pieces changed and
+    # only re-encodes the views of players who could see a changed cell.
+    __slots__ = ("cols", "rows", "pieces", "visible", "header", "views")
+
+    def __init__(self, cols: int, rows: int):
+        self.cols = cols
+        self.rows = rows
+        # piece id -> (owner name, col, row, sight range)
+        self.pieces: dict[int, tuple] = {}
+        self.visible: dict[str, list[int]] = {}
+        # Everything in game_info besides the pieces, which every view shares.
+        self.header: Optional[str] = None
+        self.views: dict[str, str] = {}
+
+    def update(self, message: dict) -> set[str]:
+        # Returns the players whose view changed.
+        game = message["game"]
+        header = encoding.dumps(
+            {key: value for key, value in game.items() if key != "boardPieces"}
+        )
+        if header != self.header:
+            self.header = header
+            self.views.clear()
+
+        pieces = {
+            piece["id"]: (
+                piece["player"]["name"],
+                piece["col"],
+                piece["row"],
+                get_unit_class(piece["className"]).sight_range,
+            )
+            for piece in game["boardPieces"]
+        }
+        changed = {
+            piece_id
+            for piece_id in pieces.keys() | self.pieces.keys()
+            if pieces.get(piece_id) != self.pieces.get(piece_id)
+        }
+        changed_cells = [
+            piece[1:3]
+            for piece_id in changed
+            for piece in (pieces.get(piece_id), self.pieces.get(piece_id))
+            if piece is not None
+        ]
+        owners = {
+            piece[0]
+            for piece_id in changed
+            for piece in (pieces.get(piece_id), self.pieces.get(piece_id))
+            if piece is not None
+        }
+        self.pieces = pieces
+
+        for owner in owners:
+            self.visible[owner] = get_visible_rows(
+                [piece[1:] for piece in pieces.values() if piece[0] == owner],
+                self.cols,
+                self.rows,
+            )
+        stale = owners | {
+            player
+            for player, visible in self.visible.items()
+            if any(is_visible(visible, col, row) for col, row in changed_cells)
+        }
+        for player in stale:
+            self.views.pop(player, None)
+        return stale
+
+    def can_see(self, player: str, col: int, row: int) -> bool:
+        visible = self.visible.get(player)
+        return visible is not None and is_visible(visible, col, row)
+
+    def get_view(self, player: str, message: dict) -> str:
+        # The player's encoded game_info, from message as passed to update.
+        view = self.views.get(player)
+        if view is None:
+            view = self.views[player] = encoding.encode_game_info(
+                self.filter_message(player, message)
+            )
+        return view
+
+    def filter_message(self, player: str, message: dict) -> dict:
+        visible = self.visible.get(player) or [0] * self.rows
+        game = message["game"]
+        return {
+            **message,
+            "game": {
+                **game,
+                "boardPieces": [
+                    piece
+                    for piece in game["boardPieces"]
+                    if is_visible(visible, piece["col"], piece["row"])
+                ],
+                "visibleRows": [format(bits, "x") for bits in visible],
+            },
+        }
+
+
+class VisibilityCache:
+    # Per-process, like the path and reachability caches, and like them only
+    # keeps the BOARD_CACHE_SIZE most recently used rooms. Each entry is
+    # brought up to date from the full game_info message it is given.
+    def __init__(self):
+        self.rooms: OrderedDict[str, RoomVisibility] = OrderedDict()
+
+    def update(self, room_name: str, message: dict) -> RoomVisibility:
+        grid = message["game"]["grid"]
+        room = self.rooms.get(room_name)
+        if room is None or (room.cols, room.rows) != (grid["cols"], grid["rows"]):
+            room = self.rooms[room_name] = RoomVisibility(grid["cols"], grid["rows"])
+        self.rooms.move_to_end(room_name)
+        while len(self.rooms) > settings.BOARD_CACHE_SIZE:
+            self.rooms.popitem(last=False)
+        room.update(message)
+        return room
+
+    def get_move_views(
+        self,
+        room_name: str,
+        message: dict,
+        moved_frame: str,
+        owner: str,
+        from_space: tuple[int, int],
+        to_space: tuple[int, int],
+    ) -> dict[str, list]:
+        # The (type, frame) pairs each player gets for a move, from the
+        # game_info message after it: players who see both ends get the
+        # move, those who see one end get their new view and the owner, whose
+        # sight moved with the piece, gets both.
+        players = [player["name"] for player in message["game"]["players"]]
+        before = self.rooms.get(room_name)
+        saw_from = {
+            player
+            for player in players
+            if before is not None and before.can_see(player, *from_space)
+        }
+        room = self.update(room_name, message)
+        views = {}
+        for player in players:
+            sees_to = room.can_see(player, *to_space)
+            if player == owner:
+                views[player] = [
+                    ("piece_moved", moved_frame),
+                    ("game_info", room.get_view(player, message)),
+                ]
+            elif sees_to and player in saw_from:
+                views[player] = [("piece_moved", moved_frame)]
+            elif sees_to or player in saw_from:
+                views[player] = [("game_info", room.get_view(player, message))]
+        return views
+
+
+visibility_cache = VisibilityCache()
@@ -1,31 +1,47 @@
-import json
 import random
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from channels.auth import login
-from channels.db import database_sync_to_async
+from django.conf import settings
 from django.contrib.auth.models import User
-from .models import Room, Client, Game, REQUIRED_PLAYER_COUNT
-from dataclasses import dataclass
+from django.db import transaction, IntegrityError
+from .models import Room, Client, Game, GamePiece, Player, REQUIRED_PLAYER_COUNT
+from chat import encoding, lobby, projections
+from .enemy_ai import enemy_planner
+from .matchmaking import claim_or_create_room, matchmaker
+from .spectators import spectator_fanout, get_spectator_group
+from .pathfinding import path_cache
+from .reachability import reachability_cache
+from .viewport import Viewport, filter_game_info_message
+from .visibility import visibility_cache
+from .batching import UNKNOWN
+from .broadcast import LOBBY_SUBSCRIBERS, get_shard
 from django.utils import timezone
-from typing import ClassVar
+from typing import ClassVar, Optional
+
+GAME_INFO_PREFETCH = (
+    "game",
+    "game__player_set",
+    "game__player_set__user",
+    "game__player_set__user__client",
+    "game__board",
+    "game__board__gamepiece_set",
+    "game__board__gamepiece_set__owner",
+    "occupants",
+)
 
 
-@dataclass
 class MessageHandler:
-    client: Client
-    scope: dict
-    consumer: AsyncWebsocketConsumer
+    # Handlers are stateless singletons shared by every connection; all
+    # per-connection state lives in consumer.state.
     message_types: ClassVar[list[str]]
 
-    async def handle(self, message_data):
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
         raise NotImplementedError()
 
-    async def send(self, text_data):
-        return await self.consumer.send(text_data=text_data)
+    async def send(self, consumer: AsyncWebsocketConsumer, text_data):
+        return await consumer.send(text_data=text_data)
 
 
-@dataclass
 class RoomInfoMixin(MessageHandler):
     @database_sync_to_async
     def get_room_info_message(self):
@@ -37,130 +53,286 @@ class RoomInfoMixin(MessageHandler):
                     "capacity": 2,
                     "occupants": [user.username for user in room.occupants.all()],
                 }
-                for room in Room.objects.all().prefetch_related("occupants")
+                for room in Room.objects.filter(
+                    pooled_at__isnull=True
+                ).prefetch_related("occupants")
             ],
         }
 
     @database_sync_to_async
-    def get_room(self, room_name=None):
-        user: User = self.scope["user"]
+    def get_room(self, consumer: AsyncWebsocketConsumer, room_name=None):
         if room_name is None:
-            room_filter = Room.objects.filter(occupants__in=[user])
+            room_filter = Room.objects.filter(occupants__id=consumer.state.user_id)
         else:
             room_filter = Room.objects.filter(name=room_name)
 
-        return room_filter.prefetch_related(
-            "game",
-            "game__player_set",
-            "game__player_set__user",
-            "game__board",
-            "game__board__gamepiece_set",
-            "game__board__gamepiece_set__owner",
-            "occupants",
-        ).first()
+        return room_filter.prefetch_related(*GAME_INFO_PREFETCH).first()
 
-    async def send_room_not_found(self):
-        await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "room error",
-                    "error": "Room not found",
-                }
+    async def get_room_name(self, consumer: AsyncWebsocketConsumer):
+        # Looked up once for all the messages of a batch.
+        batch = consumer.state.batch
+        if batch is not None and batch.room_name is not UNKNOWN:
+            return batch.room_name
+        room_name = await self.load_room_name(consumer)
+        if batch is not None:
+            batch.room_name = room_name
+        return room_name
+
+    def remember_room_name(self, consumer: AsyncWebsocketConsumer, room_name):
+        if consumer.state.batch is not None:
+            consumer.state.batch.room_name = room_name
+
+    @database_sync_to_async
+    def load_room_name(self, consumer: AsyncWebsocketConsumer):
+        return (
+            Room.objects.filter(occupants__id=consumer.state.user_id)
+            .values_list("name", flat=True)
+            .first()
+        )
+
+    @database_sync_to_async
+    def get_room_summary(self, room_name: str):
+        return lobby.get_room_summary(room_name)
+
+    async def is_occupant(
+        self, consumer: AsyncWebsocketConsumer, room_name: str
+    ) -> bool:
+        return await self.get_room_name(consumer) == room_name
+
+    @database_sync_to_async
+    def load_game_info_message(self, room_name: str, viewport: Viewport = None):
+        return projections.load_game_info_message(room_name, viewport)
+
+    @database_sync_to_async
+    def save_viewport(self, consumer: AsyncWebsocketConsumer, viewport: Viewport):
+        Client.objects.filter(pk=consumer.state.client_id).update(
+            viewport=viewport and viewport.to_message()
+        )
+
+    async def broadcast_room_updated(
+        self, consumer: AsyncWebsocketConsumer, room: Room
+    ):
+        summary = await self.get_room_summary(room.name)
+        if summary:
+            await lobby.broadcast_lobby_event(
+                consumer.channel_layer,
+                lobby.ROOM_UPDATED,
+                summary,
             )
+
+    async def send_room_not_found(self, consumer: AsyncWebsocketConsumer):
+        await self.send(
+            consumer, text_data=encoding.error_frame("room error", "Room not found")
         )
 
-    async def send_user_not_in_room(self):
+    async def send_user_not_in_room(self, consumer: AsyncWebsocketConsumer):
         await self.send(
-            text_data=json.dumps(
-                {
-                    "type": "room error",
-                    "error": "User not in room",
-                }
+            consumer, text_data=encoding.error_frame("room error", "User not in room")
+        )
+
+    async def load_game_info_frame(
+        self, consumer: AsyncWebsocketConsumer, room_name: str
+    ):
+        # game_info as this connection sees it: only what its player can see
+        # under fog of war, everything for spectators, then cut to the
+        # viewport. None if there is no such room.
+        viewport = consumer.state.viewport
+        if not settings.FOG_OF_WAR:
+            message = await self.load_game_info_message(room_name, viewport)
+            if message is None:
+                return None
+            return encoding.encode_game_info(message)
+
+        message = await self.load_game_info_message(room_name)
+        if message is None:
+            return None
+        username = consumer.state.username
+        if not any(player["name"] == username for player in message["game"]["players"]):
+            frame = encoding.encode_game_info(message)
+        else:
+            frame = visibility_cache.update(room_name, message).get_view(
+                username, message
             )
+        if viewport is None:
+            return frame
+        return encoding.encode_game_info(
+            filter_game_info_message(encoding.loads(frame), viewport)
         )
 
-    async def send_game_info(self, room: Room):
-        await self.send(
-            text_data=json.dumps(
-                self.get_game_info_message(room.game),
+    async def send_game_info(self, consumer: AsyncWebsocketConsumer, room_name: str):
+        frame = await self.load_game_info_frame(consumer, room_name)
+        if frame is None:
+            await self.send_room_not_found(consumer)
+            return
+        await self.send(consumer, text_data=frame)
+
+    async def broadcast_game_info(
+        self, consumer: AsyncWebsocketConsumer, room_name: str, changed_cells=None
+    ):
+        # changed_cells=None means the change is not limited to any cells
+        # (players, game state), so every viewport has to be refreshed.
+        message = await self.load_game_info_message(room_name)
+        if message is None:
+            return
+        recipients = await self.get_game_info_recipients(room_name)
+        for channel_name, frame in self.get_game_info_frames(
+            room_name, message, recipients, changed_cells
+        ):
+            await consumer.channel_layer.send(
+                channel_name, {"type": "forward_frame", "frame": frame}
             )
+        self.mark_spectators_dirty(consumer, room_name, message)
+
+    @database_sync_to_async
+    def get_game_info_recipients(self, room_name: str):
+        return [
+            (channel_name, username, viewport and Viewport(**viewport))
+            for channel_name, username, viewport in Client.objects.filter(
+                connected=True, user__room__name=room_name
+            ).values_list("channel_name", "user__username", "viewport")
+        ]
+
+    def get_game_info_frames(
+        self, room_name: str, message: dict, recipients: list, changed_cells
+    ):
+        # Each occupant connection's own frame, cut to its player's sight
+        # under fog of war and to its viewport here, so the channel layer
+        # only carries what that client shows. Connections whose viewport
+        # misses changed_cells get nothing.
+        room = (
+            visibility_cache.update(room_name, message) if settings.FOG_OF_WAR else None
         )
+        frames = {}
+        for channel_name, username, viewport in recipients:
+            if (
+                viewport is not None
+                and changed_cells is not None
+                and not viewport.intersects(changed_cells)
+            ):
+                continue
+            key = (username if room else None, viewport)
+            if key not in frames:
+                frames[key] = self.get_game_info_frame(
+                    room, username, message, viewport
+                )
+            yield channel_name, frames[key]
 
-    async def broadcast_game_info(self, room: Room):
-        await self.consumer.channel_layer.group_send(
-            room.name,
-            {
-                "type": "forward_broadcast",
-                "broadcast_message": self.get_game_info_message(room.game),
-            },
+    def get_game_info_frame(self, room, username: str, message: dict, viewport):
+        if room is None:
+            view = message
+        elif viewport is None:
+            return room.get_view(username, message)
+        else:
+            view = room.filter_message(username, message)
+        if viewport is not None:
+            view = filter_game_info_message(view, viewport)
+        return encoding.encode_game_info(view)
+
+    def mark_spectators_dirty(
+        self, consumer: AsyncWebsocketConsumer, room_name: str, message: dict = None
+    ):
+        async def load_message():
+            if message is not None:
+                return message
+            return await self.load_game_info_message(room_name)
+
+        spectator_fanout.mark_dirty(
+            consumer.channel_layer,
+            room_name,
+            load_message,
         )
 
-    def get_game_info_message(self, game: Game):
-        return {
+    def get_game_info_message(self, game: Game, viewport: Viewport = None):
+        # Builds game_info from a room fetched with GAME_INFO_PREFETCH. The
+        # handlers use projections.load_game_info_message, which gives the
+        # same result without instantiating any models.
+        pieces = game.board.gamepiece_set.all()
+        if viewport is not None:
+            pieces = [
+                piece for piece in pieces if viewport.contains(piece.col, piece.row)
+            ]
+
+        turn_order = game.get_turn_order()
+        message = {
             "type": "game_info",
             "game": {
                 "state": game.state,
                 "players": [
                     {
-                        "name": player.get_name(),
+                        "name": player.name,
                     }
-                    for player in sorted(
-                        list(game.player_set.all()),
-                        key=lambda player: player.order,
-                    )
+                    for player in turn_order.players()
                 ],
+                "currentPlayer": self.get_current_player_name(game, turn_order),
                 "requiredPlayers": REQUIRED_PLAYER_COUNT,
                 "grid": {
                     "cols": game.board.cols,
                     "rows": game.board.rows,
                 },
                 "boardPieces": [
-                    {
-                        "name": piece.name,
-                        "row": piece.row,
-                        "col": piece.col,
-                        "player": {
-                            "name": piece.owner.name,
-                        },
-                        "moveableSpaces": piece.get_moveable_spaces(),
-                    }
-                    for piece in game.board.gamepiece_set.all()
+                    self.get_piece_info(piece, viewport) for piece in pieces
                 ],
             },
         }
+        if viewport is not None:
+            message["game"]["viewport"] = viewport.to_message()
+        return message
+
+    def get_current_player_name(self, game: Game, turn_order):
+        current = turn_order.current_player()
+        if game.state != "playing" or current is None:
+            return None
+        return current.name
+
+    def get_piece_info(self, piece: GamePiece, viewport: Viewport = None):
+        return {
+            "id": piece.id,
+            "name": piece.name,
+            "className": piece.class_name,
+            "row": piece.row,
+            "col": piece.col,
+            "player": {
+                "name": piece.owner.name,
+            },
+            "moveableSpaces": (
+                piece.get_moveable_spaces()
+                if viewport is None
+                else viewport.clip(piece.get_moveable_spaces())
+            ),
+        }
 
 
-@dataclass
 class NaiveAuthHandler(MessageHandler):
     message_types: ClassVar[list[str]] = ["authenticate"]
 
-    async def handle(self, message_data):
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
         username = message_data["username"]
         client_name = message_data["client_name"]
 
         user = await self.get_user(username, client_name)
         if not user:
             await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "authenticate error",
-                        "error": "User not found",
-                    }
-                )
+                consumer,
+                text_data=encoding.error_frame("authenticate error", "User not found"),
             )
         else:
-            user = await self.delete_current_client(user)
-            user = await self.assign_client(user)
-            await login(self.scope, user)
+            await self.delete_current_client(user)
+            game = await self.assign_client(consumer, user)
+            consumer.state.authenticate(user.id, user.username)
             await self.send(
-                text_data=json.dumps(
+                consumer,
+                text_data=encoding.dumps(
                     {
                         "type": "authenticated",
                         "username": user.username,
-                        "client_name": user.client.channel_name,
+                        "client_name": consumer.channel_name,
                     }
-                )
+                ),
             )
+            if game is not None:
+                # The game may have waited on its automated player while
+                # nobody could act.
+                await turn_service.resume(consumer, game)
 
     @database_sync_to_async
     def get_user(self, username: str, client_name: str):
@@ -177,34 +349,37 @@ class NaiveAuthHandler(MessageHandler):
     @database_sync_to_async
     def delete_current_client(self, user: User):
         user.client.delete()
-        return user
 
     @database_sync_to_async
-    def assign_client(self, user: User):
-        self.client.user = user
-        self.client.last_authed_message_time = timezone.now()
-        self.client.save()
-        return user
+    def assign_client(self, consumer: AsyncWebsocketConsumer, user: User):
+        Client.objects.filter(pk=consumer.state.client_id).update(
+            user=user,
+            last_authed_message_time=timezone.now(),
+        )
+        player = Player.objects.filter(user=user).select_related("game__room").first()
+        if player:
+            player.game.player_connection_changed(player, connected=True)
+            return player.game
+        return None
 
 
-@dataclass
 class NaiveCreateUserHandler(MessageHandler):
     message_types: ClassVar[list[str]] = ["create_user"]
 
-    async def handle(self, message_data):
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
         user = await self.create_user()
-        user = await self.assign_client(user)
-
-        await login(self.scope, user)
+        await self.assign_client(consumer, user)
+        consumer.state.authenticate(user.id, user.username)
 
         await self.send(
-            text_data=json.dumps(
+            consumer,
+            text_data=encoding.dumps(
                 {
                     "type": "authenticated",
                     "username": user.username,
-                    "client_name": user.client.channel_name,
+                    "client_name": consumer.channel_name,
                 }
-            )
+            ),
         )
 
     @database_sync_to_async
@@ -241,184 +416,642 @@ class NaiveCreateUserHandler(MessageHandler):
         return user
 
     @database_sync_to_async
-    def assign_client(self, user: User):
-        self.client.user = user
-        self.client.auth_time = timezone.now()
-        self.client.save()
-        return user
+    def assign_client(self, consumer: AsyncWebsocketConsumer, user: User):
+        Client.objects.filter(pk=consumer.state.client_id).update(user=user)
 
 
-@dataclass
 class AuthedUserHandler(MessageHandler):
     message_types: ClassVar[list[str]] = ["all"]
 
-    async def handle(self, message_data):
-        if self.scope["user"].is_authenticated:
-            await self.register_authed_message()
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+        # Once per batch is enough to keep the client from timing out.
+        batch = consumer.state.batch
+        if batch is not None:
+            if batch.client_touched:
+                return
+            batch.client_touched = True
+        await self.register_authed_message(consumer)
 
     @database_sync_to_async
-    def register_authed_message(self):
-        self.client.last_authed_message_time = timezone.now()
-        self.client.save()
+    def register_authed_message(self, consumer: AsyncWebsocketConsumer):
+        Client.objects.filter(pk=consumer.state.client_id).update(
+            last_authed_message_time=timezone.now()
+        )
 
 
-@dataclass
 class RoomInfoHandler(RoomInfoMixin):
     message_types: ClassVar[list[str]] = ["room_info"]
 
-    async def handle(self, message_data):
-        if not self.scope["user"].is_authenticated:
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        await self.send(
+            consumer, text_data=encoding.dumps(await self.get_room_info_message())
+        )
+
+
+class LobbySubscribeHandler(RoomInfoMixin):
+    message_types: ClassVar[list[str]] = ["lobby_subscribe"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        try:
+            lobby_filter = message_data.get("filter", lobby.ALL_ROOMS)
+            page = int(message_data.get("page", 0))
+            page_size = int(message_data.get("page_size", lobby.DEFAULT_PAGE_SIZE))
+            if (
+                lobby_filter not in lobby.LOBBY_FILTERS
+                or page < 0
+                or not 0 < page_size <= lobby.MAX_PAGE_SIZE
+            ):
+                raise ValueError()
+        except (TypeError, ValueError):
+            await self.send(
+                consumer,
+                text_data=encoding.error_frame(
+                    "lobby error", "Invalid lobby subscription"
+                ),
+            )
             return
 
-        await self.send(text_data=json.dumps(await self.get_room_info_message()))
+        if consumer.state.lobby_filter is None:
+            await consumer.channel_layer.group_add(
+                get_shard(LOBBY_SUBSCRIBERS, consumer.channel_name),
+                consumer.channel_name,
+            )
+        consumer.state.lobby_filter = lobby_filter
+        await self.send(
+            consumer,
+            text_data=encoding.dumps(
+                await self.get_room_page(lobby_filter, page, page_size)
+            ),
+        )
+
+    @database_sync_to_async
+    def get_room_page(self, lobby_filter: str, page: int, page_size: int):
+        return lobby.get_room_page(lobby_filter, page, page_size)
+
+
+class LobbyUnsubscribeHandler(MessageHandler):
+    message_types: ClassVar[list[str]] = ["lobby_unsubscribe"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        await leave_lobby(consumer)
+
+
+async def leave_lobby(consumer: AsyncWebsocketConsumer):
+    if consumer.state.lobby_filter is None:
+        return
+    consumer.state.lobby_filter = None
+    await consumer.channel_layer.group_discard(
+        get_shard(LOBBY_SUBSCRIBERS, consumer.channel_name), consumer.channel_name
+    )
 
 
-@dataclass
 class GameInfoHandler(RoomInfoMixin):
     message_types: ClassVar[list[str]] = ["game_info"]
 
-    async def handle(self, message_data):
-        user: User = self.scope["user"]
-        if not user.is_authenticated:
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
             return
 
         room_name = message_data["room_name"]
-        room: Room = await self.get_room(room_name)
-        if not room:
-            await self.send_room_not_found()
-        elif not user in room.occupants.all():
-            await self.send_user_not_in_room()
+        frame = await self.load_game_info_frame(consumer, room_name)
+        if frame is None:
+            await self.send_room_not_found(consumer)
+        elif consumer.state.spectating != room_name and not await self.is_occupant(
+            consumer, room_name
+        ):
+            await self.send_user_not_in_room(consumer)
         else:
-            await self.send_game_info(room)
+            await self.send(consumer, text_data=frame)
+
+
+class SpectateHandler(RoomInfoMixin):
+    message_types: ClassVar[list[str]] = ["spectate"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        room_name = message_data.get("room_name")
+        message = (
+            await self.load_game_info_message(room_name, consumer.state.viewport)
+            if room_name
+            else None
+        )
+        if message is None:
+            await self.send_room_not_found(consumer)
+            return
+        if settings.FOG_OF_WAR and await self.is_occupant(consumer, room_name):
+            # Spectators see the whole board.
+            await self.send(
+                consumer,
+                text_data=encoding.error_frame(
+                    "room error", "Players can't spectate their own room"
+                ),
+            )
+            return
+
+        await stop_spectating(consumer)
+        consumer.state.spectating = room_name
+        await save_spectating(consumer, room_name)
+        await consumer.channel_layer.group_add(
+            get_spectator_group(room_name),
+            consumer.channel_name,
+        )
+        await self.send(
+            consumer,
+            text_data=encoding.dumps(
+                {
+                    "type": "spectating",
+                    "room_name": room_name,
+                }
+            ),
+        )
+        await self.send(consumer, text_data=encoding.encode_game_info(message))
+
+
+class StopSpectatingHandler(MessageHandler):
+    message_types: ClassVar[list[str]] = ["stop_spectating"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        await stop_spectating(consumer)
+
+
+async def stop_spectating(consumer: AsyncWebsocketConsumer):
+    if consumer.state.spectating is None:
+        return
+    await consumer.channel_layer.group_discard(
+        get_spectator_group(consumer.state.spectating),
+        consumer.channel_name,
+    )
+    consumer.state.spectating = None
+    await save_spectating(consumer, None)
+
+
+@database_sync_to_async
+def save_spectating(consumer: AsyncWebsocketConsumer, room_name: Optional[str]):
+    Client.objects.filter(pk=consumer.state.client_id).update(spectating=room_name)
 
 
-@dataclass
 class JoinRoomHandler(RoomInfoMixin):
     message_types: ClassVar[list[str]] = ["join_room"]
 
-    async def handle(self, message_data):
-        user: User = self.scope["user"]
-        if not user.is_authenticated:
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
             return
 
-        if await self.already_in_room():
+        if await self.get_room_name(consumer) is not None:
             await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "room error",
-                        "error": "User is already in a room",
-                    }
-                )
+                consumer,
+                text_data=encoding.error_frame(
+                    "room error", "User is already in a room"
+                ),
             )
             return
 
-        room_name = message_data["room_name"]
-        room: Room = await self.get_room(room_name)
+        room_name = message_data.get("room_name")
+        if room_name is None:
+            room, joined = await self.join_pooled_room(consumer)
+        else:
+            room: Room = await self.get_room(consumer, room_name)
+            if not room:
+                await self.send(
+                    consumer,
+                    text_data=encoding.error_frame("room error", "Room not found"),
+                )
+                return
+            joined = await self.add_user_to_room(consumer, room)
 
-        if not room:
+        if joined is None:
             await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "room error",
-                        "error": "Room not found",
-                    }
-                )
+                consumer,
+                text_data=encoding.error_frame(
+                    "room error", "User is already in a room"
+                ),
             )
-        elif await self.is_full(room):
+        elif not joined:
             await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "room error",
-                        "error": "Room is full",
-                    }
-                )
+                consumer, text_data=encoding.error_frame("room error", "Room is full")
             )
         else:
-            await self.add_user_to_room(room)
-            # REFETCH ROOM TO GET UPDATED COPY OF NESTED RELATIONSHIPS
-            room = await self.get_room(room_name)
+            self.remember_room_name(consumer, room.name)
 
-            await self.consumer.channel_layer.group_add(
+            await consumer.channel_layer.group_add(
                 room.name,
-                self.consumer.channel_name,
+                consumer.channel_name,
             )
             await self.send(
-                text_data=json.dumps(
+                consumer,
+                text_data=encoding.dumps(
                     {
                         "type": "joined_room",
                         "room_name": room.name,
                     }
-                )
+                ),
             )
 
-            await self.consumer.channel_layer.group_send(
-                "ALL_USERS",
-                {
-                    "type": "forward_broadcast",
-                    "broadcast_message": await self.get_room_info_message(),
-                },
-            )
-            await self.broadcast_game_info(room)
+            await self.broadcast_room_updated(consumer, room)
+            await self.broadcast_game_info(consumer, room.name)
 
     @database_sync_to_async
-    def already_in_room(self) -> bool:
-        user: User = self.scope["user"]
-        return user.room_set.exists()
+    def join_pooled_room(self, consumer: AsyncWebsocketConsumer):
+        # Claims and seats in one transaction, so a seat that fails puts the
+        # room back in the pool rather than leaving it empty in the lobby.
+        user = User.objects.get(pk=consumer.state.user_id)
+        try:
+            with transaction.atomic():
+                room = claim_or_create_room()
+                joined = room.add_occupant(user)
+                if not joined:
+                    transaction.set_rollback(True)
+        except IntegrityError:
+            return None, None
+        return room, joined
 
     @database_sync_to_async
-    def add_user_to_room(self, room: Room):
-        user: User = self.scope["user"]
-        room.add_occupant(user)
+    def add_user_to_room(self, consumer: AsyncWebsocketConsumer, room: Room):
+        # None if a concurrent join seated the user in another room first.
+        try:
+            return room.add_occupant(User.objects.get(pk=consumer.state.user_id))
+        except IntegrityError:
+            return None
 
-    @database_sync_to_async
-    def is_full(self, room: Room):
-        return room.is_full()
+
+class MatchmakeHandler(RoomInfoMixin):
+    message_types: ClassVar[list[str]] = ["matchmake"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        if await self.get_room_name(consumer) is not None:
+            await self.send(
+                consumer,
+                text_data=encoding.error_frame(
+                    "room error", "User is already in a room"
+                ),
+            )
+            return
+
+        matchmaker.enqueue(consumer.state.user_id, consumer.channel_name)
+        await self.send(consumer, text_data=encoding.static_frame("matchmaking_queued"))
+
+
+class CancelMatchmakingHandler(MessageHandler):
+    message_types: ClassVar[list[str]] = ["cancel_matchmaking"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        if matchmaker.cancel(consumer.state.user_id):
+            await self.send(
+                consumer, text_data=encoding.static_frame("matchmaking_cancelled")
+            )
+
+
+class MatchmakingMatchedHandler(RoomInfoMixin):
+    # Handles the matchmaker's channel layer event, never a client message.
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        room_name = message_data["room_name"]
+        await consumer.channel_layer.group_add(
+            room_name,
+            consumer.channel_name,
+        )
+        await self.send(
+            consumer,
+            text_data=encoding.dumps(
+                {
+                    "type": "joined_room",
+                    "room_name": room_name,
+                }
+            ),
+        )
+        await self.broadcast_game_info(consumer, room_name)
 
 
-@dataclass
 class LeaveRoomHandler(RoomInfoMixin):
     message_types: ClassVar[list[str]] = ["leave_room"]
 
-    async def handle(self, message_data):
-        user: User = self.scope["user"]
-        if not user.is_authenticated:
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
             return
 
-        room: Room = await self.get_room()
+        room: Room = await self.get_room(consumer)
 
         if not room:
             await self.send(
-                text_data=json.dumps(
-                    {
-                        "type": "leave room error",
-                        "error": "Room not found",
-                    }
-                )
+                consumer,
+                text_data=encoding.error_frame("leave room error", "Room not found"),
             )
         else:
-            await self.remove_user_from(room)
-            await self.consumer.channel_layer.group_discard(
+            game = await self.remove_user_from(consumer, room)
+            self.remember_room_name(consumer, None)
+            consumer.state.viewport = None
+            await consumer.channel_layer.group_discard(
                 room.name,
-                self.consumer.channel_name,
+                consumer.channel_name,
             )
             await self.send(
-                text_data=json.dumps(
+                consumer,
+                text_data=encoding.dumps(
                     {
                         "type": "left_room",
                         "room_name": room.name,
                     }
-                )
+                ),
             )
-            await self.consumer.channel_layer.group_send(
-                "ALL_USERS",
-                {
-                    "type": "forward_broadcast",
-                    "broadcast_message": await self.get_room_info_message(),
-                },
+            await self.broadcast_room_updated(consumer, room)
+            await self.broadcast_game_info(consumer, room.name)
+            await turn_service.resume(consumer, game)
+
+    @database_sync_to_async
+    def remove_user_from(self, consumer: AsyncWebsocketConsumer, room: Room):
+        room.remove_occupant(User.objects.get(pk=consumer.state.user_id))
+        Client.objects.filter(pk=consumer.state.client_id).update(viewport=None)
+        # Reloaded, with its room, since refreshing the room drops it.
+        return room.game
+
+
+class SubscribeViewportHandler(RoomInfoMixin):
+    message_types: ClassVar[list[str]] = ["subscribe_viewport"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        try:
+            viewport = Viewport.from_message(message_data)
+        except (KeyError, TypeError, ValueError):
+            await self.send(
+                consumer,
+                text_data=encoding.error_frame("viewport error", "Invalid viewport"),
             )
-            await self.broadcast_game_info(room)
+            return
+
+        room_name = await self.get_room_name(consumer)
+        if not room_name:
+            await self.send_room_not_found(consumer)
+        else:
+            consumer.state.viewport = viewport
+            await self.save_viewport(consumer, viewport)
+            await self.send_game_info(consumer, room_name)
+
+
+class UnsubscribeViewportHandler(RoomInfoMixin):
+    message_types: ClassVar[list[str]] = ["unsubscribe_viewport"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        consumer.state.viewport = None
+        await self.save_viewport(consumer, None)
+        room_name = await self.get_room_name(consumer)
+        if room_name:
+            await self.send_game_info(consumer, room_name)
+
+
+class MovePieceHandler(RoomInfoMixin):
+    message_types: ClassVar[list[str]] = ["move_piece"]
+
+    async def handle(self, consumer: AsyncWebsocketConsumer, message_data):
+        if not consumer.state.is_authenticated:
+            return
+
+        try:
+            piece_id = int(message_data["piece_id"])
+            col = int(message_data["col"])
+            row = int(message_data["row"])
+        except (KeyError, TypeError, ValueError):
+            await self.send_move_error(consumer, "Invalid move")
+            return
+
+        piece: GamePiece = await self.get_own_piece(consumer, piece_id)
+        if not piece:
+            await self.send_move_error(consumer, "Piece not found")
+            return
+        if piece.owner.game.state != "playing":
+            await self.send_move_error(consumer, "Game is not in progress")
+            return
+        if not await self.is_players_turn(piece):
+            await self.send_move_error(consumer, "Not your turn")
+            return
+
+        error = await turn_service.apply_move(consumer, piece, col, row)
+        if error:
+            await self.send_move_error(consumer, error)
+            return
+
+        await turn_service.end_turn(consumer, piece.owner.game)
+
+    async def send_move_error(self, consumer: AsyncWebsocketConsumer, error: str):
+        await self.send(consumer, text_data=encoding.error_frame("move error", error))
 
     @database_sync_to_async
-    def remove_user_from(self, room: Room):
-        user: User = self.scope["user"]
-        room.remove_occupant(user)
+    def get_own_piece(self, consumer: AsyncWebsocketConsumer, piece_id: int):
+        return (
+            GamePiece.objects.filter(pk=piece_id, owner__user_id=consumer.state.user_id)
+            .select_related("board", "owner__game__room")
+            .first()
+        )
+
+    @database_sync_to_async
+    def is_players_turn(self, piece: GamePiece):
+        current = piece.owner.game.get_turn_order().current_player()
+        return current is not None and current.player_id == piece.owner_id
+
+
+class TurnService(RoomInfoMixin):
+    # The one place turns are passed on. A move ends its player's turn here,
+    # and every other change that can hand the turn to someone else (a
+    # disconnect, a leave, a reconnect) calls in too, so an automated player
+    # always gets its turn played, whichever path gave it the turn. game must
+    # have its room loaded.
+    async def end_turn(self, consumer: AsyncWebsocketConsumer, game: Game):
+        await self.play_turns(consumer, game, await self.advance_turn(game))
+
+    async def resume(self, consumer: AsyncWebsocketConsumer, game: Game):
+        # For changes that may have left an automated player to act without
+        # ending anyone's turn.
+        current = await self.get_current_player(game)
+        if current is not None and current.automated:
+            await self.play_turns(consumer, game, current)
+
+    async def play_turns(self, consumer: AsyncWebsocketConsumer, game: Game, current):
+        # Plays automated turns until one a human can take comes up, then
+        # tells the room whose turn it is. Bounded, and stops when nobody
+        # else can act, so a game without connected humans waits on its
+        # automated player until someone reconnects and resumes it.
+        for _i in range(await self.get_player_count(game)):
+            if current is None or not current.automated:
+                break
+            await self.play_automated_turn(consumer, game, current)
+            played, current = current, await self.advance_turn(game)
+            if current is played:
+                break
+
+        await consumer.channel_layer.group_send(
+            game.room.name,
+            {
+                "type": "forward_broadcast",
+                "broadcast_message": {
+                    "type": "turn_changed",
+                    "currentPlayer": current.name if current else None,
+                },
+            },
+        )
+        self.mark_spectators_dirty(consumer, game.room.name)
+
+    async def play_automated_turn(
+        self, consumer: AsyncWebsocketConsumer, game: Game, player
+    ):
+        snapshot = await self.get_plan_snapshot(game)
+        for piece_id, col, row in await enemy_planner.plan(snapshot):
+            piece = await self.get_piece(piece_id, player.player_id)
+            if piece:
+                await self.apply_move(consumer, piece, col, row)
+
+    async def apply_move(
+        self, consumer: AsyncWebsocketConsumer, piece: GamePiece, col: int, row: int
+    ):
+        reachable = reachability_cache.get(piece)
+        if reachable is None:
+            reachable = await self.compute_reachable(piece)
+        if (col, row) not in reachable:
+            return "Space is not reachable"
+
+        from_space = (piece.col, piece.row)
+        path = await self.find_path(piece, col, row)
+        if not await self.move(piece, col, row):
+            return "Space is occupied"
+
+        room_name = piece.owner.game.room.name
+        message = {
+            "type": "piece_moved",
+            "from": from_space,
+            "path": path,
+            "piece": self.get_piece_info(piece),
+        }
+        frame = encoding.dumps(message)
+        views = None
+        game_info = None
+        if settings.FOG_OF_WAR:
+            game_info = await self.load_game_info_message(room_name)
+            if game_info is not None:
+                views = visibility_cache.get_move_views(
+                    room_name,
+                    game_info,
+                    frame,
+                    piece.owner.name,
+                    from_space,
+                    (col, row),
+                )
+        changed_cells = [from_space, (col, row)]
+        if views is None:
+            event = {
+                "type": "forward_piece_moved",
+                "broadcast_message": message,
+                "frame": frame,
+                "changed_cells": changed_cells,
+            }
+        else:
+            # Every player's frames are in views already.
+            event = {
+                "type": "forward_piece_moved",
+                "views": views,
+                "changed_cells": changed_cells,
+            }
+        await consumer.channel_layer.group_send(room_name, event)
+        self.mark_spectators_dirty(consumer, room_name, game_info)
+        return None
+
+    @database_sync_to_async
+    def get_piece(self, piece_id: int, player_id: int):
+        return (
+            GamePiece.objects.filter(pk=piece_id, owner_id=player_id)
+            .select_related("board", "owner__game__room")
+            .first()
+        )
+
+    @database_sync_to_async
+    def get_plan_snapshot(self, game: Game):
+        return game.get_plan_snapshot()
+
+    @database_sync_to_async
+    def get_player_count(self, game: Game):
+        return len(game.get_turn_order())
+
+    @database_sync_to_async
+    def advance_turn(self, game: Game):
+        return game.advance_turn()
+
+    @database_sync_to_async
+    def get_current_player(self, game: Game):
+        return game.get_turn_order().current_player()
+
+    @database_sync_to_async
+    def compute_reachable(self, piece: GamePiece):
+        return reachability_cache.compute(piece)
+
+    @database_sync_to_async
+    def find_path(self, piece: GamePiece, col: int, row: int):
+        return path_cache.get_path(piece.board, (piece.col, piece.row), (col, row))
+
+    @database_sync_to_async
+    def move(self, piece: GamePiece, col: int, row: int):
+        return piece.move_to(col, row)
+
+
+turn_service = TurnService()
+
+
+HANDLERS = [
+    NaiveCreateUserHandler(),
+    NaiveAuthHandler(),
+    RoomInfoHandler(),
+    LobbySubscribeHandler(),
+    LobbyUnsubscribeHandler(),
+    JoinRoomHandler(),
+    LeaveRoomHandler(),
+    MatchmakeHandler(),
+    CancelMatchmakingHandler(),
+    GameInfoHandler(),
+    SpectateHandler(),
+    StopSpectatingHandler(),
+    SubscribeViewportHandler(),
+    UnsubscribeViewportHandler(),
+    MovePieceHandler(),
+    AuthedUserHandler(),
+]
+matchmaking_matched_handler = MatchmakingMatchedHandler()
+
+
+def build_dispatch_table(handlers: list[MessageHandler]) -> dict:
+    # Maps each message type to its handlers in the order of handlers, with
+    # the "all" handlers in their place.
+    message_types = {
+        message_type for handler in handlers for message_type in handler.message_types
+    }
+    return {
+        message_type: [
+            handler
+            for handler in handlers
+            if message_type in handler.message_types or "all" in handler.message_types
+        ]
+        for message_type in message_types
+    }
+
+
+handlers_by_type = build_dispatch_table(HANDLERS)
+
+
+def get_handlers(message_type: str) -> list[MessageHandler]:
+    return handlers_by_type.get(message_type, handlers_by_type["all"])
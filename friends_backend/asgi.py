@@ -9,7 +9,6 @@ https://docs.djangoproject.com/en/4.1/howto/deployment/asgi/
 
 import os
 
-from channels.auth import AuthMiddlewareStack
 from channels.sessions import SessionMiddlewareStack
 from channels.routing import ProtocolTypeRouter, URLRouter
 from channels.security.websocket import AllowedHostsOriginValidator
@@ -17,16 +16,21 @@ from django.core.asgi import get_asgi_application
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "friends_backend.settings")
 
+# Sets up Django, so it has to come before anything that imports models.
+django_asgi_app = get_asgi_application()
+
 import chat.routing
+from chat.hot_state import warm_start
 
 application = ProtocolTypeRouter(
     {
-        "http": get_asgi_application(),
+        "http": django_asgi_app,
+        # Connections keep their user in consumer.state rather than a
+        # session-backed scope["user"].
         "websocket": AllowedHostsOriginValidator(
-            AuthMiddlewareStack(
-                # SessionMiddlewareStack(
-                URLRouter(chat.routing.websocket_urlpatterns),
-            )
+            URLRouter(chat.routing.websocket_urlpatterns),
         ),
     }
 )
+
+warm_start.start()
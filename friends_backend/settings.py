@@ -76,13 +76,65 @@ ASGI_APPLICATION = "friends_backend.asgi.application"
 
 CHANNEL_LAYERS = {
     "default": {
-        "BACKEND": "channels_redis.core.RedisChannelLayer",
+        "BACKEND": "chat.channel_layers.HybridChannelLayer",
         "CONFIG": {
             "hosts": [("127.0.0.1", 6379)],
+            # Only safe when one process serves every websocket; see
+            # chat/channel_layers.py.
+            "single_process": False,
         },
     },
 }
 
+# Broadcast groups (lobby subscribers) are split into this many channel layer
+# groups, each kept small and sent to concurrently.
+BROADCAST_SHARD_COUNT = 16
+
+# "auto" uses orjson when it is installed and the stdlib json module if not.
+JSON_ENCODER = "auto"
+
+# Load every active game's turn order and path grid before serving.
+WARM_START = True
+
+# Set to a file path to record every websocket frame for replay_ws_traffic.
+TRAFFIC_RECORDING_PATH = None
+# The recording is flushed to disk once roughly this many bytes have built
+# up or this many seconds have passed, whichever comes first.
+TRAFFIC_FLUSH_BYTES = 1 << 16
+TRAFFIC_FLUSH_INTERVAL = 1.0
+
+# The most messages one {"batch": [...]} frame may carry.
+MAX_MESSAGES_PER_BATCH = 20
+
+ENEMY_AI_PROCESSES = 2
+ENEMY_AI_TURN_BUDGET = 0.5
+
+MATCHMAKING_INTERVAL = 0.1
+MATCHMAKING_BATCH_SIZE = 1000
+
+SPECTATOR_FRAME_INTERVAL = 0.5
+
+# Boards each per-process board cache (paths, reachability, visibility)
+# keeps, by recency.
+BOARD_CACHE_SIZE = 10000
+
+# Players only see pieces within the sight_range of one of their own. Off by
+# default; turning it on changes what every game in progress shows.
+FOG_OF_WAR = False
+
+# Stats per GamePiece.class_name; ranges are in steps.
+UNIT_CLASSES = {
+    "brigand": {"movement": 4, "attack_range": 1, "sight_range": 3},
+    "archer": {"movement": 3, "attack_range": 2, "sight_range": 4},
+    "cavalier": {"movement": 6, "attack_range": 1, "sight_range": 3},
+}
+
+ROOM_POOL_SIZE = 10
+ROOM_POOL_MAX_AGE_MINUTES = 60
+
+# Finished games archived per transaction by archive_finished_games.
+ARCHIVE_BATCH_SIZE = 100
+
 RQ_QUEUES = {
     "default": {
         "HOST": "127.0.0.1",
@@ -0,0 +1 @@
+python manage.py bench_models
\ No newline at end of file